@@ -0,0 +1,42 @@
+"""Add release_year column to movies
+
+Revision ID: 008_add_movie_release_year
+Revises: 007_make_movie_tmdb_id_nullable
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_movie_release_year'
+down_revision = '007_make_movie_tmdb_id_nullable'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Add an indexable year parsed from release_date (used by the random filters)
+    op.add_column('movies', sa.Column('release_year', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_movies_release_year'), 'movies', ['release_year'], unique=False)
+
+    # Backfill from the existing release dates
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            "UPDATE movies SET release_year = EXTRACT(YEAR FROM release_date)::integer "
+            "WHERE release_date IS NOT NULL"
+        )
+    elif dialect == 'mysql':
+        op.execute("UPDATE movies SET release_year = YEAR(release_date) WHERE release_date IS NOT NULL")
+    else:
+        op.execute(
+            "UPDATE movies SET release_year = CAST(SUBSTR(release_date, 1, 4) AS INTEGER) "
+            "WHERE release_date IS NOT NULL"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_movies_release_year'), table_name='movies')
+    op.drop_column('movies', 'release_year')
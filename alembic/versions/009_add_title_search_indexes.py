@@ -0,0 +1,54 @@
+"""Add full-text / trigram indexes for title search
+
+Revision ID: 009_add_title_search_indexes
+Revises: 008_add_movie_release_year
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '009_add_title_search_indexes'
+down_revision = '008_add_movie_release_year'
+branch_labels = None
+depends_on = None
+
+# Must match services.search.pg_title_document()
+PG_TITLE_DOCUMENT = "to_tsvector('simple'::regconfig, coalesce(title, '') || ' ' || coalesce(original_title, ''))"
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # CONCURRENTLY cannot run inside a transaction; it keeps the table writable
+        with op.get_context().autocommit_block():
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_movies_title_trgm "
+                "ON movies USING gin (title gin_trgm_ops)"
+            )
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_movies_original_title_trgm "
+                "ON movies USING gin (original_title gin_trgm_ops)"
+            )
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_movies_title_tsv "
+                f"ON movies USING gin ({PG_TITLE_DOCUMENT})"
+            )
+    elif dialect == 'mysql':
+        op.execute("CREATE FULLTEXT INDEX ft_movies_title ON movies (title, original_title)")
+    # Other databases (SQLite for local tests) fall back to ILIKE without an index
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_movies_title_tsv")
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_movies_original_title_trgm")
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_movies_title_trgm")
+    elif dialect == 'mysql':
+        op.drop_index('ft_movies_title', table_name='movies')
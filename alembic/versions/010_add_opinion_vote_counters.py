@@ -0,0 +1,57 @@
+"""Add denormalized vote counters to generated_opinions
+
+Revision ID: 010_add_opinion_vote_counters
+Revises: 009_add_title_search_indexes
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_add_opinion_vote_counters'
+down_revision = '009_add_title_search_indexes'
+branch_labels = None
+depends_on = None
+
+COUNTER_COLUMNS = ['up_votes', 'down_votes', 'lol_votes', 'wtf_votes', 'vote_count', 'vote_balance']
+
+
+def upgrade() -> None:
+    # Counters kept up to date on every vote (see services/votes.py)
+    for column in COUNTER_COLUMNS:
+        op.add_column(
+            'generated_opinions',
+            sa.Column(column, sa.Integer(), nullable=False, server_default='0')
+        )
+
+    # Backfill from the votes cast so far
+    op.execute(
+        "UPDATE generated_opinions SET "
+        "up_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.generated_opinion_id = generated_opinions.id AND v.vote_type = 'UP'), "
+        "down_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.generated_opinion_id = generated_opinions.id AND v.vote_type = 'DOWN'), "
+        "lol_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.generated_opinion_id = generated_opinions.id AND v.vote_type = 'LOL'), "
+        "wtf_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.generated_opinion_id = generated_opinions.id AND v.vote_type = 'WTF'), "
+        "vote_count = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.generated_opinion_id = generated_opinions.id)"
+    )
+    op.execute("UPDATE generated_opinions SET vote_balance = up_votes - down_votes")
+
+    # Serves GET /opiniones/top as an index range scan
+    op.create_index(
+        'ix_generated_opinions_absurdity_balance',
+        'generated_opinions',
+        ['absurdity_score', 'vote_balance', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_generated_opinions_absurdity_balance', table_name='generated_opinions')
+    for column in reversed(COUNTER_COLUMNS):
+        op.drop_column('generated_opinions', column)
@@ -0,0 +1,76 @@
+"""Add opinion_vote_buckets for trending opinions
+
+Revision ID: 011_add_opinion_vote_buckets
+Revises: 010_add_opinion_vote_counters
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011_add_opinion_vote_buckets'
+down_revision = '010_add_opinion_vote_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Per-opinion hourly / daily vote rollups (see services/trending.py)
+    op.create_table(
+        'opinion_vote_buckets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('generated_opinion_id', sa.Integer(), nullable=True),
+        sa.Column('user_opinion_id', sa.Integer(), nullable=True),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('bucket_hours', sa.Integer(), nullable=False),
+        sa.Column('up_votes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('down_votes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('lol_votes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('wtf_votes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('vote_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['generated_opinion_id'], ['generated_opinions.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_opinion_id'], ['user_opinions.id'], ondelete='CASCADE'),
+        sa.CheckConstraint(
+            '(generated_opinion_id IS NOT NULL AND user_opinion_id IS NULL) OR '
+            '(generated_opinion_id IS NULL AND user_opinion_id IS NOT NULL)',
+            name='ck_opinion_vote_buckets_one_opinion'
+        ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_opinion_vote_buckets_bucket_start'), 'opinion_vote_buckets', ['bucket_start'], unique=False)
+    op.create_index('uq_opinion_vote_buckets_generated', 'opinion_vote_buckets',
+                    ['generated_opinion_id', 'bucket_hours', 'bucket_start'], unique=True)
+    op.create_index('uq_opinion_vote_buckets_user', 'opinion_vote_buckets',
+                    ['user_opinion_id', 'bucket_hours', 'bucket_start'], unique=True)
+
+    # Backfill hourly buckets from the votes cast so far; the compaction job
+    # folds and drops the old ones afterwards
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        hour = "date_trunc('hour', created_at)"
+    elif dialect == 'mysql':
+        hour = "DATE_FORMAT(created_at, '%Y-%m-%d %H:00:00')"
+    else:
+        hour = "strftime('%Y-%m-%d %H:00:00', created_at)"
+    for foreign_key in ('generated_opinion_id', 'user_opinion_id'):
+        op.execute(
+            f"INSERT INTO opinion_vote_buckets "
+            f"({foreign_key}, bucket_start, bucket_hours, up_votes, down_votes, lol_votes, wtf_votes, vote_count) "
+            f"SELECT {foreign_key}, {hour}, 1, "
+            f"SUM(CASE WHEN vote_type = 'UP' THEN 1 ELSE 0 END), "
+            f"SUM(CASE WHEN vote_type = 'DOWN' THEN 1 ELSE 0 END), "
+            f"SUM(CASE WHEN vote_type = 'LOL' THEN 1 ELSE 0 END), "
+            f"SUM(CASE WHEN vote_type = 'WTF' THEN 1 ELSE 0 END), "
+            f"COUNT(*) "
+            f"FROM opinion_votes WHERE {foreign_key} IS NOT NULL "
+            f"GROUP BY {foreign_key}, {hour}"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_opinion_vote_buckets_user', table_name='opinion_vote_buckets')
+    op.drop_index('uq_opinion_vote_buckets_generated', table_name='opinion_vote_buckets')
+    op.drop_index(op.f('ix_opinion_vote_buckets_bucket_start'), table_name='opinion_vote_buckets')
+    op.drop_table('opinion_vote_buckets')
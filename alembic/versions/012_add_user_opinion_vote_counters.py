@@ -0,0 +1,54 @@
+"""Add denormalized vote counters to user_opinions
+
+Revision ID: 012_add_user_opinion_vote_counters
+Revises: 011_add_opinion_vote_buckets
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012_add_user_opinion_vote_counters'
+down_revision = '011_add_opinion_vote_buckets'
+branch_labels = None
+depends_on = None
+
+COUNTER_COLUMNS = ['up_votes', 'down_votes', 'lol_votes', 'wtf_votes', 'vote_count', 'vote_balance']
+
+
+def upgrade() -> None:
+    # Same counters as generated_opinions (see services/votes.py)
+    for column in COUNTER_COLUMNS:
+        op.add_column(
+            'user_opinions',
+            sa.Column(column, sa.Integer(), nullable=False, server_default='0')
+        )
+
+    # Backfill from the votes cast so far
+    op.execute(
+        "UPDATE user_opinions SET "
+        "up_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.user_opinion_id = user_opinions.id AND v.vote_type = 'UP'), "
+        "down_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.user_opinion_id = user_opinions.id AND v.vote_type = 'DOWN'), "
+        "lol_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.user_opinion_id = user_opinions.id AND v.vote_type = 'LOL'), "
+        "wtf_votes = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.user_opinion_id = user_opinions.id AND v.vote_type = 'WTF'), "
+        "vote_count = (SELECT COUNT(*) FROM opinion_votes v "
+        "WHERE v.user_opinion_id = user_opinions.id)"
+    )
+    op.execute("UPDATE user_opinions SET vote_balance = up_votes - down_votes")
+
+    # Serve /opiniones/user/top and /pelicula/{id}/opinions as index range scans
+    op.create_index('ix_user_opinions_balance', 'user_opinions', ['vote_balance', 'id'], unique=False)
+    op.create_index('ix_user_opinions_movie_balance', 'user_opinions', ['movie_id', 'vote_balance', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_opinions_movie_balance', table_name='user_opinions')
+    op.drop_index('ix_user_opinions_balance', table_name='user_opinions')
+    for column in reversed(COUNTER_COLUMNS):
+        op.drop_column('user_opinions', column)
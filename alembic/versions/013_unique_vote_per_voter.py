@@ -0,0 +1,87 @@
+"""One vote per voter and opinion
+
+Revision ID: 013_unique_vote_per_voter
+Revises: 012_add_user_opinion_vote_counters
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '013_unique_vote_per_voter'
+down_revision = '012_add_user_opinion_vote_counters'
+branch_labels = None
+depends_on = None
+
+OPINION_TABLES = {
+    'generated_opinion_id': 'generated_opinions',
+    'user_opinion_id': 'user_opinions',
+}
+
+
+def upgrade() -> None:
+    # Keep only the latest vote of each voter on each opinion. The extra derived
+    # table lets MySQL delete from the table it selects from.
+    for foreign_key in OPINION_TABLES:
+        op.execute(
+            f"DELETE FROM opinion_votes "
+            f"WHERE {foreign_key} IS NOT NULL AND voter_identifier IS NOT NULL "
+            f"AND id NOT IN (SELECT id FROM ("
+            f"SELECT MAX(id) AS id FROM opinion_votes "
+            f"WHERE {foreign_key} IS NOT NULL AND voter_identifier IS NOT NULL "
+            f"GROUP BY {foreign_key}, voter_identifier"
+            f") AS keep)"
+        )
+
+    # Recount the opinions' counters without the removed votes
+    for foreign_key, table in OPINION_TABLES.items():
+        op.execute(
+            f"UPDATE {table} SET "
+            f"up_votes = (SELECT COUNT(*) FROM opinion_votes v "
+            f"WHERE v.{foreign_key} = {table}.id AND v.vote_type = 'UP'), "
+            f"down_votes = (SELECT COUNT(*) FROM opinion_votes v "
+            f"WHERE v.{foreign_key} = {table}.id AND v.vote_type = 'DOWN'), "
+            f"lol_votes = (SELECT COUNT(*) FROM opinion_votes v "
+            f"WHERE v.{foreign_key} = {table}.id AND v.vote_type = 'LOL'), "
+            f"wtf_votes = (SELECT COUNT(*) FROM opinion_votes v "
+            f"WHERE v.{foreign_key} = {table}.id AND v.vote_type = 'WTF'), "
+            f"vote_count = (SELECT COUNT(*) FROM opinion_votes v "
+            f"WHERE v.{foreign_key} = {table}.id)"
+        )
+        op.execute(f"UPDATE {table} SET vote_balance = up_votes - down_votes")
+
+    # Rebuild the trending buckets the same way 011 backfilled them
+    op.execute("DELETE FROM opinion_vote_buckets")
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        hour = "date_trunc('hour', created_at)"
+    elif dialect == 'mysql':
+        hour = "DATE_FORMAT(created_at, '%Y-%m-%d %H:00:00')"
+    else:
+        hour = "strftime('%Y-%m-%d %H:00:00', created_at)"
+    for foreign_key in OPINION_TABLES:
+        op.execute(
+            f"INSERT INTO opinion_vote_buckets "
+            f"({foreign_key}, bucket_start, bucket_hours, up_votes, down_votes, lol_votes, wtf_votes, vote_count) "
+            f"SELECT {foreign_key}, {hour}, 1, "
+            f"SUM(CASE WHEN vote_type = 'UP' THEN 1 ELSE 0 END), "
+            f"SUM(CASE WHEN vote_type = 'DOWN' THEN 1 ELSE 0 END), "
+            f"SUM(CASE WHEN vote_type = 'LOL' THEN 1 ELSE 0 END), "
+            f"SUM(CASE WHEN vote_type = 'WTF' THEN 1 ELSE 0 END), "
+            f"COUNT(*) "
+            f"FROM opinion_votes WHERE {foreign_key} IS NOT NULL "
+            f"GROUP BY {foreign_key}, {hour}"
+        )
+
+    # Enforce it, and let record_vote() find a voter's earlier vote by index
+    op.create_index('uq_opinion_votes_generated_voter', 'opinion_votes',
+                    ['generated_opinion_id', 'voter_identifier'], unique=True)
+    op.create_index('uq_opinion_votes_user_voter', 'opinion_votes',
+                    ['user_opinion_id', 'voter_identifier'], unique=True)
+
+
+def downgrade() -> None:
+    # Removed duplicate votes are not restored
+    op.drop_index('uq_opinion_votes_user_voter', table_name='opinion_votes')
+    op.drop_index('uq_opinion_votes_generated_voter', table_name='opinion_votes')
@@ -0,0 +1,48 @@
+"""Add lower(title) / lower(original_title) indexes
+
+Revision ID: 014_add_lower_title_indexes
+Revises: 013_unique_vote_per_voter
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '014_add_lower_title_indexes'
+down_revision = '013_unique_vote_per_voter'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_movies_title_lower': 'lower(title)',
+    'ix_movies_original_title_lower': 'lower(original_title)',
+}
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    # Case-insensitive duplicate checks of the bulk movie import
+    if dialect == 'postgresql':
+        # CONCURRENTLY cannot run inside a transaction; it keeps the table writable
+        with op.get_context().autocommit_block():
+            for name, expression in INDEXES.items():
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON movies ({expression})")
+    elif dialect == 'mysql':
+        # Functional key parts (MySQL 8.0.13+) need their own parentheses
+        for name, expression in INDEXES.items():
+            op.execute(f"CREATE INDEX {name} ON movies (({expression}))")
+    else:
+        for name, expression in INDEXES.items():
+            op.execute(f"CREATE INDEX {name} ON movies ({expression})")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name in reversed(list(INDEXES)):
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    else:
+        for name in reversed(list(INDEXES)):
+            op.drop_index(name, table_name='movies')
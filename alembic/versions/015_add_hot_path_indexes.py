@@ -0,0 +1,70 @@
+"""Add genre / original title indexes, drop redundant ones
+
+Revision ID: 015_add_hot_path_indexes
+Revises: 014_add_lower_title_indexes
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '015_add_hot_path_indexes'
+down_revision = '014_add_lower_title_indexes'
+branch_labels = None
+depends_on = None
+
+# name -> (table, columns)
+NEW_INDEXES = {
+    # Genre filters and genre deletes: the primary key (movie_id, genre_id) only serves movie_id
+    'ix_movie_genres_genre_id': ('movie_genres', 'genre_id'),
+    # Exact title / original_title duplicate check of POST /pelicula
+    'ix_movies_original_title': ('movies', 'original_title'),
+}
+
+# Single-column indexes on primary keys (the primary key index already covers
+# them), and the opinion_votes foreign key indexes, which are the leading
+# column of uq_opinion_votes_generated_voter / uq_opinion_votes_user_voter.
+# Each one is written on every INSERT without serving any query.
+REDUNDANT_INDEXES = {
+    'ix_genres_id': ('genres', 'id'),
+    'ix_movies_id': ('movies', 'id'),
+    'ix_external_reviews_id': ('external_reviews', 'id'),
+    'ix_generated_opinions_id': ('generated_opinions', 'id'),
+    'ix_user_opinions_id': ('user_opinions', 'id'),
+    'ix_opinion_votes_id': ('opinion_votes', 'id'),
+    'ix_opinion_votes_generated_opinion_id': ('opinion_votes', 'generated_opinion_id'),
+    'ix_opinion_votes_user_opinion_id': ('opinion_votes', 'user_opinion_id'),
+}
+
+
+def _create(indexes) -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY cannot run inside a transaction; it keeps the tables writable
+        with op.get_context().autocommit_block():
+            for name, (table, columns) in indexes.items():
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+    else:
+        for name, (table, columns) in indexes.items():
+            op.create_index(name, table, [columns], unique=False)
+
+
+def _drop(indexes) -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name in indexes:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    else:
+        for name, (table, _) in indexes.items():
+            op.drop_index(name, table_name=table)
+
+
+def upgrade() -> None:
+    # New indexes first, so no query is left without one in between
+    _create(NEW_INDEXES)
+    _drop(REDUNDANT_INDEXES)
+
+
+def downgrade() -> None:
+    _create(REDUNDANT_INDEXES)
+    _drop(NEW_INDEXES)
@@ -0,0 +1,29 @@
+"""Add previous_vote_type / previous_created_at to opinion_votes
+
+Revision ID: 016_add_previous_vote_columns
+Revises: 015_add_hot_path_indexes
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '016_add_previous_vote_columns'
+down_revision = '015_add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Written by the vote upsert (services/votes.py record_vote): the vote a
+    # changed vote replaced, so the counters move without reading the row first.
+    # Nullable without a default: adding them doesn't rewrite the table.
+    op.add_column('opinion_votes', sa.Column('previous_vote_type', sa.String(length=20), nullable=True))
+    op.add_column('opinion_votes', sa.Column('previous_created_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('opinion_votes', 'previous_created_at')
+    op.drop_column('opinion_votes', 'previous_vote_type')
@@ -0,0 +1,26 @@
+"""
+Fold old hourly vote buckets into daily ones and drop buckets past the trending window.
+
+Every API worker already runs this every TRENDING_COMPACT_SECONDS; run it by hand
+(or from cron) when the API is scaled to zero or after a bulk vote import.
+"""
+from database import SessionLocal
+from services.trending import compact_vote_buckets
+
+
+def main():
+    db = SessionLocal()
+    try:
+        print("🗜️  Compacting vote buckets...")
+        folded, dropped = compact_vote_buckets(db)
+        print(f"✅ Folded {folded} hourly buckets into daily ones, dropped {dropped} expired buckets")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error compacting vote buckets: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
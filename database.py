@@ -1,33 +1,249 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+import logging
 import os
 
+from services import query_budget
+from services.pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+from services.replicas import ReplicaSet
+
 load_dotenv()
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+logger = logging.getLogger(__name__)
+
+
+def _database_url(url: str) -> str:
+    # Fix Render's postgres:// URL to postgresql:// for SQLAlchemy
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+SQLALCHEMY_DATABASE_URL = _database_url(os.getenv("DATABASE_URL"))
+
+# Read replicas (comma-separated URLs) for the GET endpoints; empty reads from the primary
+DATABASE_REPLICA_URLS = [
+    _database_url(url.strip()) for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+
+# Seconds a replica that couldn't be connected to is left out of the rotation
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+# Connection pool per worker process: DB_POOL_SIZE connections kept open, up to
+# DB_MAX_OVERFLOW more under load, DB_POOL_TIMEOUT seconds of waiting for one
+# before giving up. Size it so workers x (size + overflow) stays under the
+# database's max_connections (GET /internal/pool shows the actual use).
+# Each replica engine gets a pool of the same size.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Pre-ping tests each connection with a round trip on every checkout. Without
+# it, DB_POOL_RECYCLE (seconds) alone retires connections before the server or
+# a proxy drops them; -1 never recycles.
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+POOL_SETTINGS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys when each connection asks for it
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _create_engine(url):
+    new_engine = create_engine(url, poolclass=InstrumentedQueuePool, echo=False, **POOL_SETTINGS)
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine, "connect", _enable_sqlite_foreign_keys)
+    query_budget.install(new_engine)
+    return new_engine
 
-# Fix Render's postgres:// URL to postgresql:// for SQLAlchemy
-if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
-    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=1800,
-    echo=False
-)
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+read_replicas = ReplicaSet([_create_engine(url) for url in DATABASE_REPLICA_URLS], REPLICA_RETRY_SECONDS)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: rows written by a request keep their values after the
+# commit, so building the response doesn't need a refresh SELECT per row
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
+# DB_ASYNC=true serves requests with an asyncio engine instead: handlers wait
+# on the database in the event loop rather than holding a threadpool thread.
+# The handlers' Python code then runs on the event loop thread too, so it only
+# pays off while they mostly wait on queries: CPU-heavy parts (filtered random
+# picks, fuzzy search, cache rebuilds) go through services/offload.py's
+# run_blocking(), and any other slow Python code in a handler delays every
+# request of the worker.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
 
-def get_db():
+# asyncio driver used for each database in async mode
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+}
+
+
+def async_database_url(url):
+    """
+    The same database with its asyncio driver, plus the connect arguments it needs.
+
+    Returns:
+        (url, connect_args)
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    connect_args = {}
+    if backend == "postgresql" and "sslmode" in url.query:
+        # asyncpg takes libpq's sslmode values as its ssl argument
+        connect_args["ssl"] = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"])
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}"), connect_args
+
+
+async_engine = None
+async_read_replicas = ReplicaSet([], REPLICA_RETRY_SECONDS)
+AsyncSessionLocal = None
+if DB_ASYNC:
+    # Imported only in async mode, so the sync deployment doesn't need the asyncio drivers
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    def _create_async_engine(url):
+        async_url, connect_args = async_database_url(url)
+        new_engine = create_async_engine(
+            async_url,
+            connect_args=connect_args,
+            poolclass=InstrumentedAsyncQueuePool,
+            echo=False,
+            **POOL_SETTINGS
+        )
+        if new_engine.dialect.name == "sqlite":
+            event.listen(new_engine.sync_engine, "connect", _enable_sqlite_foreign_keys)
+        query_budget.install(new_engine.sync_engine)
+        return new_engine
+
+    async_engine = _create_async_engine(SQLALCHEMY_DATABASE_URL)
+    async_read_replicas = ReplicaSet(
+        [_create_async_engine(url) for url in DATABASE_REPLICA_URLS], REPLICA_RETRY_SECONDS
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# "Referenced row does not exist": PostgreSQL SQLSTATE and MySQL error number
+PG_FOREIGN_KEY_VIOLATION = "23503"
+MYSQL_NO_REFERENCED_ROW = 1452
+
+# Request header asking GET endpoints to read from the primary (read-your-writes)
+CONSISTENCY_HEADER = "X-Consistency"
+
+
+def get_db(request: Request):
     """
     Dependency that provides a database session for each request.
     Ensures the session is closed after the request is complete.
+
+    The session carries the statement timeout and query cap of the router
+    serving the request (services/query_budget.py).
     """
     db = SessionLocal()
+    query_budget.attach_budget(db, request.scope.get("route"))
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db(request: Request):
+    """
+    Read-only counterpart of get_db() for GET endpoints.
+
+    The session reads from the next available replica (see services/replicas.py),
+    or from the primary when no replica is configured or reachable, or when
+    the client sends `X-Consistency: strong` to read its own writes.
+    """
+    connection = None
+    if not _wants_primary(request):
+        for replica in read_replicas.candidates():
+            try:
+                connection = replica.connect()
+                break
+            except OperationalError:
+                logger.warning("Read replica %s unavailable, trying the next one", replica.url, exc_info=True)
+                read_replicas.mark_down(replica)
+
+    if connection is None:
+        yield from get_db(request)
+        return
+    db = SessionLocal(bind=connection)
+    query_budget.attach_budget(db, request.scope.get("route"))
+    try:
+        yield db
+    finally:
+        db.close()
+        connection.close()
+
+
+async def get_async_db(request: Request):
+    """
+    Async mode counterpart of get_db(): an AsyncSession for each request.
+
+    Route handlers written against the sync Session run on it through
+    AsyncSession.run_sync() (see routers/async_routes.py).
+    """
+    async with AsyncSessionLocal() as db:
+        query_budget.attach_budget(db.sync_session, request.scope.get("route"))
+        yield db
+
+
+async def get_async_read_db(request: Request):
+    """Async mode counterpart of get_read_db()."""
+    connection = None
+    if not _wants_primary(request):
+        for replica in async_read_replicas.candidates():
+            try:
+                connection = await replica.connect()
+                break
+            except OperationalError:
+                logger.warning("Read replica %s unavailable, trying the next one", replica.url, exc_info=True)
+                async_read_replicas.mark_down(replica)
+
+    if connection is None:
+        async for db in get_async_db(request):
+            yield db
+        return
+    try:
+        async with AsyncSessionLocal(bind=connection) as db:
+            query_budget.attach_budget(db.sync_session, request.scope.get("route"))
+            yield db
+    finally:
+        await connection.close()
+
+
+def _wants_primary(request: Request) -> bool:
+    return request.headers.get(CONSISTENCY_HEADER, "").lower() == "strong"
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    """
+    Whether an IntegrityError means a referenced (parent) row doesn't exist.
+
+    Write paths insert child rows directly and let the foreign key stand in for
+    an existence check; this tells that case apart from other constraint errors.
+    """
+    orig = error.orig
+    if PG_FOREIGN_KEY_VIOLATION in (getattr(orig, "pgcode", None), getattr(orig, "sqlstate", None)):
+        return True
+    args = getattr(orig, "args", ())
+    if args and args[0] == MYSQL_NO_REFERENCED_ROW:
+        return True
+    return "FOREIGN KEY constraint failed" in str(orig)  # SQLite
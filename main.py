@@ -1,23 +1,109 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Security
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
 
-from database import engine
+from auth import verify_api_key
+from database import DB_ASYNC, async_engine, async_read_replicas, engine, read_replicas, SessionLocal
 from routers import movies, opinions, votes
+from services.pool_metrics import pool_status
+from services.query_budget import QueryBudgetExceeded
+from services.catalog import rebuild_catalog_indexes, CATALOG_REFRESH_SECONDS
+from services.trending import compact_vote_buckets, TRENDING_COMPACT_SECONDS
+from services.vote_buffer import VOTE_BUFFER_ENABLED, opinion_ids, vote_buffer
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not defined. Check your .env file")
 
+
+def _rebuild_catalog_indexes():
+    db = SessionLocal()
+    try:
+        rebuild_catalog_indexes(db)
+    except SQLAlchemyError:
+        # Keep serving; the next refresh (or the first random pick) retries
+        logger.exception("Could not rebuild catalog indexes")
+    finally:
+        db.close()
+
+
+def _reload_opinion_ids():
+    db = SessionLocal()
+    try:
+        opinion_ids.reload(db)
+    except SQLAlchemyError:
+        # Keep serving; unknown ids fall back to a primary key lookup
+        logger.exception("Could not reload the opinion id cache")
+    finally:
+        db.close()
+
+
+async def _refresh_catalog_indexes():
+    while True:
+        await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+        await run_in_threadpool(_rebuild_catalog_indexes)
+        if VOTE_BUFFER_ENABLED:
+            await run_in_threadpool(_reload_opinion_ids)
+
+
+def _compact_vote_buckets():
+    db = SessionLocal()
+    try:
+        folded, dropped = compact_vote_buckets(db)
+        logger.info("Vote buckets compacted (%d folded, %d dropped)", folded, dropped)
+    except SQLAlchemyError:
+        db.rollback()
+        logger.exception("Could not compact vote buckets")
+    finally:
+        db.close()
+
+
+async def _compact_vote_buckets_periodically():
+    while True:
+        await asyncio.sleep(TRENDING_COMPACT_SECONDS)
+        await run_in_threadpool(_compact_vote_buckets)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the in-process catalog indexes before taking traffic
+    await run_in_threadpool(_rebuild_catalog_indexes)
+    if VOTE_BUFFER_ENABLED:
+        await run_in_threadpool(_reload_opinion_ids)
+        vote_buffer.start()
+    background_tasks = [
+        asyncio.create_task(_refresh_catalog_indexes()),
+        asyncio.create_task(_compact_vote_buckets_periodically()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    if VOTE_BUFFER_ENABLED:
+        # Store every vote still queued before the worker exits
+        await run_in_threadpool(vote_buffer.stop)
+    if async_engine is not None:
+        await async_engine.dispose()
+        for replica_engine in async_read_replicas.engines:
+            await replica_engine.dispose()
+
+
 app = FastAPI(
     title="UnreliableUnicorn API",
     description="The Critic You Shouldn't Trust - Real movie data mixed with absurd opinions!",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -29,10 +115,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(QueryBudgetExceeded)
+async def query_budget_exceeded(request: Request, error: QueryBudgetExceeded):
+    # Fail fast instead of holding a pooled connection (see services/query_budget.py)
+    logger.warning(
+        "%s %s exceeded the %s database budget (%s): %s",
+        request.method, request.url.path, error.router, error.reason, error.statement
+    )
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "This request needed too much database time, please try again later"}
+    )
+
+
 # Include routers
-app.include_router(movies.router)
-app.include_router(opinions.router)
-app.include_router(votes.router)
+if DB_ASYNC:
+    # Same handlers, run on an AsyncSession instead of in the threadpool
+    from routers.async_routes import async_router
+    for router in (movies.router, opinions.router, votes.router):
+        app.include_router(async_router(router))
+else:
+    app.include_router(movies.router)
+    app.include_router(opinions.router)
+    app.include_router(votes.router)
 
 
 @app.get("/")
@@ -42,9 +148,12 @@ def read_root():
         "tagline": "The Critic You Shouldn't Trust",
         "endpoints": {
             "random_movie": "/pelicula/random",
+            "random_movies": "/pelicula/random/batch?count=20",
             "search_movies": "/pelicula/search?q=interstellar",
+            "autocomplete": "/pelicula/autocomplete?q=inter",
             "add_opinion": "/pelicula/{id}/opinion",
             "top_opinions": "/opiniones/top",
+            "trending_opinions": "/opiniones/trending",
             "vote_on_opinion": "/vote/opinion/{id}",
             "vote_on_user_opinion": "/vote/user-opinion/{id}",
             "health_check": "/health/db",
@@ -61,3 +170,17 @@ def health_db():
         return {"db": "ok"}
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"DB error: {str(e)}")
+
+
+@app.get("/internal/pool", include_in_schema=False)
+def pool_stats(api_key: str = Security(verify_api_key)):
+    """Connection pool use of this worker process (see services/pool_metrics.py)."""
+    pools = {"sync": pool_status(engine.pool)}
+    if async_engine is not None:
+        pools["async"] = pool_status(async_engine.pool)
+    # Replicas serving the GET endpoints: the async engines in async mode
+    replica_set = async_read_replicas if async_engine is not None else read_replicas
+    replicas = replica_set.status()
+    for replica, replica_engine in zip(replicas, replica_set.engines):
+        replica["pool"] = pool_status(replica_engine.pool)
+    return {"pid": os.getpid(), "pools": pools, "replicas": replicas}
@@ -2,7 +2,7 @@ from models.base import Base
 from models.movie import Movie, Genre, movie_genres
 from models.review import ExternalReview, ReviewSource
 from models.opinion import GeneratedOpinion, UserOpinion
-from models.vote import OpinionVote, VoteType
+from models.vote import OpinionVote, OpinionVoteBucket, VoteType
 
 __all__ = [
     "Base",
@@ -14,5 +14,6 @@ __all__ = [
     "GeneratedOpinion",
     "UserOpinion",
     "OpinionVote",
+    "OpinionVoteBucket",
     "VoteType",
 ]
@@ -1,27 +1,39 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Table, ForeignKey
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Table, ForeignKey, Index, func
+from sqlalchemy.orm import relationship, validates
+from datetime import date, datetime
 from models.base import Base
 
 
+def parse_release_year(release_date):
+    """Extract the year from a release date ("YYYY-MM-DD" string or date), or None."""
+    if isinstance(release_date, date):
+        return release_date.year
+    if release_date and len(release_date) >= 4 and release_date[:4].isdigit():
+        return int(release_date[:4])
+    return None
+
+
 # Association table for many-to-many relationship between movies and genres
 movie_genres = Table(
     'movie_genres',
     Base.metadata,
     Column('movie_id', Integer, ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True),
-    Column('genre_id', Integer, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True)
+    Column('genre_id', Integer, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key only serves lookups by movie_id
+    Index('ix_movie_genres_genre_id', 'genre_id')
 )
 
 
 class Movie(Base):
     __tablename__ = 'movies'
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     tmdb_id = Column(Integer, unique=True, nullable=True, index=True)
     title = Column(String(255), nullable=False, index=True)
-    original_title = Column(String(255), nullable=True)
+    original_title = Column(String(255), nullable=True, index=True)
     overview = Column(Text, nullable=True)
     release_date = Column(String(50), nullable=True)
+    release_year = Column(Integer, nullable=True, index=True)  # parsed from release_date
     runtime = Column(Integer, nullable=True)  # in minutes
     poster_url = Column(String(500), nullable=True)
     backdrop_url = Column(String(500), nullable=True)
@@ -37,6 +49,18 @@ class Movie(Base):
     generated_opinions = relationship("GeneratedOpinion", back_populates="movie", cascade="all, delete-orphan")
     user_opinions = relationship("UserOpinion", back_populates="movie", cascade="all, delete-orphan")
 
+    # Case-insensitive title lookups for duplicate checks (services/movie_import.py)
+    __table_args__ = (
+        Index('ix_movies_title_lower', func.lower(title)),
+        Index('ix_movies_original_title_lower', func.lower(original_title)),
+    )
+
+    @validates('release_date')
+    def _sync_release_year(self, key, value):
+        # Keep the indexable year in step with the free-form release date
+        self.release_year = parse_release_year(value)
+        return value
+
     def __repr__(self):
         return f"<Movie(id={self.id}, title='{self.title}')>"
 
@@ -44,7 +68,7 @@ class Movie(Base):
 class Genre(Base):
     __tablename__ = 'genres'
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     tmdb_id = Column(Integer, unique=True, nullable=True, index=True)
     name = Column(String(100), unique=True, nullable=False, index=True)
 
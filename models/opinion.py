@@ -1,13 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from models.base import Base
 
 
-class GeneratedOpinion(Base):
+class VoteCountersMixin:
+    """Per-opinion vote counters, kept in step with opinion_votes by services/votes.py"""
+    up_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    down_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    lol_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    wtf_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    vote_count = Column(Integer, default=0, server_default='0', nullable=False)
+    vote_balance = Column(Integer, default=0, server_default='0', nullable=False)  # up - down
+
+
+class GeneratedOpinion(VoteCountersMixin, Base):
     __tablename__ = 'generated_opinions'
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     movie_id = Column(Integer, ForeignKey('movies.id', ondelete='CASCADE'), nullable=False, index=True)
     content = Column(Text, nullable=False)
     absurdity_score = Column(Float, default=0.0, nullable=False)  # 0-10 scale for how absurd
@@ -18,14 +28,19 @@ class GeneratedOpinion(Base):
     movie = relationship("Movie", back_populates="generated_opinions")
     votes = relationship("OpinionVote", back_populates="generated_opinion", cascade="all, delete-orphan")
 
+    # Serves /opiniones/top: ORDER BY absurdity_score DESC, vote_balance DESC, id DESC
+    __table_args__ = (
+        Index('ix_generated_opinions_absurdity_balance', 'absurdity_score', 'vote_balance', 'id'),
+    )
+
     def __repr__(self):
         return f"<GeneratedOpinion(id={self.id}, movie_id={self.movie_id}, absurdity={self.absurdity_score})>"
 
 
-class UserOpinion(Base):
+class UserOpinion(VoteCountersMixin, Base):
     __tablename__ = 'user_opinions'
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     movie_id = Column(Integer, ForeignKey('movies.id', ondelete='CASCADE'), nullable=False, index=True)
     author_name = Column(String(255), nullable=True)
     content = Column(Text, nullable=False)
@@ -35,5 +50,11 @@ class UserOpinion(Base):
     movie = relationship("Movie", back_populates="user_opinions")
     votes = relationship("OpinionVote", back_populates="user_opinion", cascade="all, delete-orphan")
 
+    # Serve /opiniones/user/top and /pelicula/{id}/opinions: ORDER BY vote_balance DESC, id DESC
+    __table_args__ = (
+        Index('ix_user_opinions_balance', 'vote_balance', 'id'),
+        Index('ix_user_opinions_movie_balance', 'movie_id', 'vote_balance', 'id'),
+    )
+
     def __repr__(self):
         return f"<UserOpinion(id={self.id}, movie_id={self.movie_id}, author='{self.author_name}')>"
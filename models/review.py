@@ -17,7 +17,7 @@ class ReviewSource(str, enum.Enum):
 class ExternalReview(Base):
     __tablename__ = 'external_reviews'
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     movie_id = Column(Integer, ForeignKey('movies.id', ondelete='CASCADE'), nullable=False, index=True)
     source = Column(Enum(ReviewSource), nullable=False, index=True)
     author = Column(String(255), nullable=True)
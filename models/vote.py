@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, CheckConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from models.base import Base
@@ -15,27 +15,65 @@ class VoteType(str, enum.Enum):
 class OpinionVote(Base):
     __tablename__ = 'opinion_votes'
 
-    id = Column(Integer, primary_key=True, index=True)
-    generated_opinion_id = Column(Integer, ForeignKey('generated_opinions.id', ondelete='CASCADE'), nullable=True, index=True)
-    user_opinion_id = Column(Integer, ForeignKey('user_opinions.id', ondelete='CASCADE'), nullable=True, index=True)
+    id = Column(Integer, primary_key=True)
+    generated_opinion_id = Column(Integer, ForeignKey('generated_opinions.id', ondelete='CASCADE'), nullable=True)
+    user_opinion_id = Column(Integer, ForeignKey('user_opinions.id', ondelete='CASCADE'), nullable=True)
     vote_type = Column(Enum(VoteType), nullable=False)
     voter_identifier = Column(String(255), nullable=True)  # IP or session ID for anonymous voting
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # The vote this one replaced, written by the upsert in services/votes.py record_vote()
+    previous_vote_type = Column(Enum(VoteType), nullable=True)
+    previous_created_at = Column(DateTime, nullable=True)
 
     # Relationships
     generated_opinion = relationship("GeneratedOpinion", back_populates="votes")
     user_opinion = relationship("UserOpinion", back_populates="votes")
 
-    # Constraint: exactly one opinion_id must be set
+    # Constraint: exactly one opinion_id must be set; one vote per voter and opinion
+    # (the unique indexes also serve lookups by opinion id)
     __table_args__ = (
         CheckConstraint(
             '(generated_opinion_id IS NOT NULL AND user_opinion_id IS NULL) OR '
             '(generated_opinion_id IS NULL AND user_opinion_id IS NOT NULL)',
             name='ck_opinion_votes_one_opinion'
         ),
+        Index('uq_opinion_votes_generated_voter', 'generated_opinion_id', 'voter_identifier', unique=True),
+        Index('uq_opinion_votes_user_voter', 'user_opinion_id', 'voter_identifier', unique=True),
     )
 
     def __repr__(self):
         opinion_id = self.generated_opinion_id or self.user_opinion_id
         opinion_type = "generated" if self.generated_opinion_id else "user"
         return f"<OpinionVote(id={self.id}, {opinion_type}_opinion_id={opinion_id}, vote='{self.vote_type}')>"
+
+
+class OpinionVoteBucket(Base):
+    """Votes an opinion received during one hour (bucket_hours=1) or one day (bucket_hours=24)"""
+    __tablename__ = 'opinion_vote_buckets'
+
+    id = Column(Integer, primary_key=True)
+    generated_opinion_id = Column(Integer, ForeignKey('generated_opinions.id', ondelete='CASCADE'), nullable=True)
+    user_opinion_id = Column(Integer, ForeignKey('user_opinions.id', ondelete='CASCADE'), nullable=True)
+    bucket_start = Column(DateTime, nullable=False, index=True)
+    bucket_hours = Column(Integer, nullable=False, default=1)
+    up_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    down_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    lol_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    wtf_votes = Column(Integer, default=0, server_default='0', nullable=False)
+    vote_count = Column(Integer, default=0, server_default='0', nullable=False)
+
+    # One bucket per opinion and period; also the conflict target of the vote upsert
+    __table_args__ = (
+        CheckConstraint(
+            '(generated_opinion_id IS NOT NULL AND user_opinion_id IS NULL) OR '
+            '(generated_opinion_id IS NULL AND user_opinion_id IS NOT NULL)',
+            name='ck_opinion_vote_buckets_one_opinion'
+        ),
+        Index('uq_opinion_vote_buckets_generated', 'generated_opinion_id', 'bucket_hours', 'bucket_start', unique=True),
+        Index('uq_opinion_vote_buckets_user', 'user_opinion_id', 'bucket_hours', 'bucket_start', unique=True),
+    )
+
+    def __repr__(self):
+        opinion_id = self.generated_opinion_id or self.user_opinion_id
+        opinion_type = "generated" if self.generated_opinion_id else "user"
+        return f"<OpinionVoteBucket({opinion_type}_opinion_id={opinion_id}, start={self.bucket_start}, hours={self.bucket_hours})>"
@@ -9,6 +9,7 @@ import httpx
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from models import Base, Movie, Genre, ExternalReview, GeneratedOpinion, ReviewSource
+from services.genre_registry import genre_registry, link_genres
 
 load_dotenv()
 
@@ -113,8 +114,7 @@ def populate_genres(session):
     genres_data = fetch_genres()
 
     for genre_data in genres_data:
-        existing = session.query(Genre).filter_by(tmdb_id=genre_data["id"]).first()
-        if not existing:
+        if genre_registry.id_for_tmdb_id(session, genre_data["id"]) is None:
             genre = Genre(
                 tmdb_id=genre_data["id"],
                 name=genre_data["name"]
@@ -122,6 +122,7 @@ def populate_genres(session):
             session.add(genre)
 
     session.commit()
+    genre_registry.reload(session)
     print(f"✓ Added {len(genres_data)} genres")
     return {g["id"]: g["name"] for g in genres_data}
 
@@ -161,11 +162,9 @@ def populate_movies(session, genre_map, num_pages=5):
             session.add(movie)
             session.flush()  # Get the movie ID
 
-            # Add genres
-            for genre_id in movie_data.get("genre_ids", []):
-                genre = session.query(Genre).filter_by(tmdb_id=genre_id).first()
-                if genre:
-                    movie.genres.append(genre)
+            # Add genres (ids from the genre registry, no query per genre)
+            genre_ids = [genre_registry.id_for_tmdb_id(session, tmdb_id) for tmdb_id in movie_data.get("genre_ids", [])]
+            link_genres(session, movie.id, [genre_id for genre_id in genre_ids if genre_id is not None])
 
             # Fetch and add reviews from TMDb
             reviews = fetch_movie_reviews(movie_data["id"])
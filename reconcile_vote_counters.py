@@ -0,0 +1,29 @@
+"""
+Recompute the per-opinion vote counters from the opinion_votes table.
+
+The counters are updated on every vote, so this is only needed after votes were
+written or deleted outside the API (manual SQL, restores, ...).
+"""
+from database import SessionLocal
+from models import GeneratedOpinion, UserOpinion
+from services.votes import reconcile_vote_counters
+
+
+def main():
+    db = SessionLocal()
+    try:
+        print("🔄 Reconciling vote counters...")
+        for model in (GeneratedOpinion, UserOpinion):
+            reconcile_vote_counters(db, model)
+            db.commit()
+            print(f"✅ Counters recomputed for {db.query(model).count()} rows of {model.__tablename__}")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error reconciling vote counters: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Async versions of the routers, used when DB_ASYNC=true.
+
+The route handlers are written against a sync Session from get_db(), so
+FastAPI runs them in Starlette's threadpool and a request waiting on the
+database holds one of its threads. async_router() copies a router with every
+such handler wrapped in a coroutine that takes an AsyncSession from
+get_async_db() (get_async_read_db() for handlers on get_read_db()) and runs
+the handler through AsyncSession.run_sync(): the same code, but each query is
+awaited on the asyncio driver, so concurrency is bounded by the event loop
+and the connection pool instead of the threadpool.
+
+The rest of the handler runs on the event loop thread as well, where slow
+Python code blocks every other request of the worker. The CPU-heavy parts
+(in-memory index searches, fuzzy scoring, cache rebuilds) therefore run
+through services.offload.run_blocking(), which moves them to the threadpool.
+
+Handlers that are already coroutines, or that don't take a database session,
+are kept as they are.
+"""
+import functools
+import inspect
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db, get_async_read_db, get_db, get_read_db
+
+# Async dependency replacing each sync session dependency
+ASYNC_SESSION_DEPENDENCIES = {
+    get_db: get_async_db,
+    get_read_db: get_async_read_db,
+}
+
+
+def async_router(router: APIRouter) -> APIRouter:
+    """A copy of `router` whose sync database handlers run on an AsyncSession."""
+    converted = APIRouter()
+    for route in router.routes:
+        if isinstance(route, APIRoute) and _session_parameter(route.endpoint) is not None:
+            route = _async_route(route)
+        converted.routes.append(route)
+    return converted
+
+
+def _session_parameter(endpoint) -> Optional[str]:
+    """Name of the handler's session parameter (get_db / get_read_db), if it is a sync handler with one."""
+    if inspect.iscoroutinefunction(endpoint):
+        return None
+    for parameter in inspect.signature(endpoint).parameters.values():
+        if getattr(parameter.default, "dependency", None) in ASYNC_SESSION_DEPENDENCIES:
+            return parameter.name
+    return None
+
+
+def _async_route(route: APIRoute) -> APIRoute:
+    """Rebuild a route around an async wrapper of its handler, keeping every other setting."""
+    settings = {
+        name: getattr(route, name)
+        for name in inspect.signature(APIRoute.__init__).parameters
+        if name not in ("self", "path", "endpoint")
+    }
+    return APIRoute(route.path, _run_on_async_session(route.endpoint), **settings)
+
+
+def _run_on_async_session(endpoint):
+    session_name = _session_parameter(endpoint)
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        db: AsyncSession = kwargs.pop(session_name)
+        return await db.run_sync(lambda session: endpoint(**kwargs, **{session_name: session}))
+
+    # Same parameters for FastAPI to resolve, with the session from the async dependency
+    signature = inspect.signature(endpoint)
+    dependency = ASYNC_SESSION_DEPENDENCIES[signature.parameters[session_name].default.dependency]
+    wrapper.__signature__ = signature.replace(parameters=[
+        parameter.replace(default=Depends(dependency), annotation=AsyncSession)
+        if parameter.name == session_name else parameter
+        for parameter in signature.parameters.values()
+    ])
+    return wrapper
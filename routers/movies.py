@@ -1,58 +1,155 @@
-import random
-from fastapi import APIRouter, HTTPException, Depends, Query, Security
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, Security
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
 from typing import Optional, List
 
-from models import Movie, ExternalReview, GeneratedOpinion, UserOpinion, Genre
+from models import Movie, ExternalReview, GeneratedOpinion, UserOpinion
 from models.review import ReviewSource
-from schemas.movie import RandomMovieResponse, MovieResponse, MovieCreate, MovieDetailResponse
-from schemas.opinion import OpinionCreate, OpinionResponse, GeneratedOpinionCreate, GeneratedOpinionResponse
-from schemas.review import ReviewCreate, ReviewResponse
-from database import get_db
+from schemas.movie import (
+    RandomMovieResponse, MovieResponse, MovieCreate, MovieDetailResponse, RandomWeighting, AutocompleteSuggestion,
+    GenreSchema
+)
+from schemas.opinion import (
+    OpinionCreate, OpinionResponse, GeneratedOpinionCreate, GeneratedOpinionResponse, TopUserOpinionResponse,
+    BatchGeneratedOpinionCreate, BatchCreateResult, BatchCreateResponse
+)
+from schemas.review import ReviewCreate, ReviewResponse, BatchReviewCreate
+from database import get_db, get_read_db, is_foreign_key_violation
 from auth import verify_api_key
+from services.movie_index import movie_index
+from services.autocomplete import autocomplete_index, MAX_SUGGESTIONS
+from services.bulk_insert import ROW_CREATED, ROW_NOT_FOUND, insert_rows, movie_titles
+from services.catalog import register_movie
+from services.genre_registry import genre_registry, link_genres
+from services.movie_import import MovieImport, ndjson_lines
+from services.search import find_movies_by_title, find_movies_fuzzy
+from services.pagination import encode_cursor, decode_cursor, set_next_cursor
+from services.leaderboard import leaderboard, RankedOpinion
+from services.vote_buffer import opinion_ids
+from services.votes import ranked_user_opinions, user_opinion_responses
+from services.movie_content import DEFAULT_FAKE_OPINION, random_review_texts, random_opinion_texts
 
 router = APIRouter(prefix="/pelicula", tags=["movies"])
 
+# How many stale ids (movies deleted since the index was loaded) we tolerate
+# before reloading the index from the database
+RANDOM_PICK_ATTEMPTS = 3
+
+
+def random_movie_filters(
+    genre: Optional[str] = Query(default=None, description="Only movies with this genre (e.g. 'Drama')"),
+    year_from: Optional[int] = Query(default=None, ge=1800, le=3000, description="Earliest release year"),
+    year_to: Optional[int] = Query(default=None, ge=1800, le=3000, description="Latest release year"),
+    min_rating: Optional[float] = Query(default=None, ge=0.0, le=10.0, description="Minimum vote average"),
+    weighted: Optional[RandomWeighting] = Query(default=None, description="Pick in proportion to 'popularity' instead of uniformly")
+) -> dict:
+    """Optional filters shared by the random endpoints, answered by the in-process movie index."""
+    return {
+        "genre": genre,
+        "year_from": year_from,
+        "year_to": year_to,
+        "min_rating": min_rating,
+        "weighted": weighted,
+    }
+
+
+def _no_movies_detail(filters: dict) -> str:
+    if any(value is not None for key, value in filters.items() if key != "weighted"):
+        return "No movies match the given filters"
+    return "No movies found in database"
+
 
 @router.get("/random", response_model=RandomMovieResponse)
-def get_random_movie(db: Session = Depends(get_db)):
+def get_random_movie(
+    filters: dict = Depends(random_movie_filters),
+    db: Session = Depends(get_read_db)
+):
     """
     Returns a random movie with one real review and one fake, funny opinion.
 
     The magic of UnreliableUnicorn: mixing authentic reviews with absurd opinions!
+    Optionally narrow the pick by genre, release year range and minimum rating,
+    or favour popular movies with weighted=popularity.
     """
-    # Get a random movie (PostgreSQL uses random(), MySQL uses rand())
-    movie = db.query(Movie).order_by(func.random()).first()
+    # Pick a random id from the in-process index and fetch it by primary key
+    movie = None
+    for attempt in range(RANDOM_PICK_ATTEMPTS + 1):
+        if attempt == RANDOM_PICK_ATTEMPTS:
+            movie_index.reload(db)
+        movie_id = movie_index.sample(db, **filters)
+        if movie_id is None:
+            break
+        movie = db.get(Movie, movie_id)
+        if movie:
+            break
+        movie_index.discard(movie_id)
 
     if not movie:
-        raise HTTPException(status_code=404, detail="No movies found in database")
+        raise HTTPException(status_code=404, detail=_no_movies_detail(filters))
+
+    # Pick a random real review (if exists) and a random fake opinion in SQL
+    real_review_text = random_review_texts(db, [movie.id]).get(movie.id)
+    fake_opinion_text = random_opinion_texts(db, [movie.id]).get(movie.id, DEFAULT_FAKE_OPINION)
+
+    return _random_movie_response(movie, real_review_text, fake_opinion_text)
+
+
+@router.get("/random/batch", response_model=List[RandomMovieResponse])
+def get_random_movies(
+    count: int = Query(default=10, ge=1, le=50, description="Number of distinct movies to return"),
+    filters: dict = Depends(random_movie_filters),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Returns several distinct random movies, each with one real review and one fake opinion.
 
-    # Get a random real review (if exists)
-    real_review_text = None
-    if movie.external_reviews:
-        random_review = random.choice(movie.external_reviews)
-        real_review_text = random_review.content
+    Fills a whole carousel in one call: movies, genres, reviews and opinions are
+    loaded with a fixed number of queries, however many movies are requested.
+    """
+    movie_ids = movie_index.sample_many(db, count, **filters)
+
+    movies_by_id = {
+        movie.id: movie
+        for movie in db.query(Movie).options(selectinload(Movie.genres)).filter(Movie.id.in_(movie_ids))
+    }
+    # Drop ids of movies deleted since the index was loaded
+    for movie_id in movie_ids:
+        if movie_id not in movies_by_id:
+            movie_index.discard(movie_id)
+
+    if not movies_by_id:
+        raise HTTPException(status_code=404, detail=_no_movies_detail(filters))
+
+    found_ids = [movie_id for movie_id in movie_ids if movie_id in movies_by_id]
+    review_texts = random_review_texts(db, found_ids)
+    opinion_texts = random_opinion_texts(db, found_ids)
+
+    return [
+        _random_movie_response(
+            movies_by_id[movie_id],
+            review_texts.get(movie_id),
+            opinion_texts.get(movie_id, DEFAULT_FAKE_OPINION)
+        )
+        for movie_id in found_ids
+    ]
 
-    # Get a random fake opinion
-    fake_opinion_text = "This movie is unreliable... like a unicorn!"
-    if movie.generated_opinions:
-        random_opinion = random.choice(movie.generated_opinions)
-        fake_opinion_text = random_opinion.content
 
+def _random_movie_response(movie: Movie, real_review_text: Optional[str], fake_opinion_text: str) -> RandomMovieResponse:
+    """Format a movie with its picked review and opinion."""
     # Format genres as list of names
     genre_names = [genre.name for genre in movie.genres]
 
-    # Convert date to string if it exists
-    release_date_str = movie.release_date.isoformat() if movie.release_date else None
-
     return RandomMovieResponse(
         id=movie.id,
         title=movie.title,
         original_title=movie.original_title,
         poster_url=movie.poster_url,
         backdrop_url=movie.backdrop_url,
-        release_date=release_date_str,
+        release_date=movie.release_date,
         runtime=movie.runtime,
         vote_average=movie.vote_average,
         genres=genre_names,
@@ -61,6 +158,25 @@ def get_random_movie(db: Session = Depends(get_db)):
     )
 
 
+def _commit_or_404(db: Session, movie_id: int):
+    """Commit a new row referencing movie_id; a foreign key violation means the movie doesn't exist."""
+    try:
+        db.commit()
+    except IntegrityError as error:
+        db.rollback()
+        if is_foreign_key_violation(error):
+            raise HTTPException(status_code=404, detail=f"Movie with id {movie_id} not found")
+        raise
+
+
+def _movie_title(db: Session, movie_id: int) -> str:
+    """Title from the autocomplete index; only movies it doesn't know yet cost a query."""
+    title = autocomplete_index.title_of(movie_id)
+    if title is None:
+        title = db.query(Movie.title).filter(Movie.id == movie_id).scalar()
+    return title
+
+
 @router.post("/{movie_id}/opinion", response_model=OpinionResponse, status_code=201)
 def add_opinion(
     movie_id: int,
@@ -73,12 +189,7 @@ def add_opinion(
 
     Submit your own take on the movie - absurd or not, we won't judge!
     """
-    # Check if movie exists
-    movie = db.query(Movie).filter(Movie.id == movie_id).first()
-    if not movie:
-        raise HTTPException(status_code=404, detail=f"Movie with id {movie_id} not found")
-
-    # Create new user opinion
+    # Create new user opinion; the movie_id foreign key checks that the movie exists
     new_opinion = UserOpinion(
         movie_id=movie_id,
         author_name=opinion_data.author_name,
@@ -86,13 +197,12 @@ def add_opinion(
     )
 
     db.add(new_opinion)
-    db.commit()
-    db.refresh(new_opinion)
+    _commit_or_404(db, movie_id)
 
     return OpinionResponse(
         id=new_opinion.id,
         movie_id=new_opinion.movie_id,
-        movie_title=movie.title,
+        movie_title=_movie_title(db, movie_id),
         author_name=new_opinion.author_name,
         content=new_opinion.content,
         created_at=new_opinion.created_at.isoformat()
@@ -112,12 +222,7 @@ def add_absurd_opinion(
     Generate hilarious, nonsensical, or satirical opinions with an absurdity score.
     Perfect for adding humor to movie reviews!
     """
-    # Check if movie exists
-    movie = db.query(Movie).filter(Movie.id == movie_id).first()
-    if not movie:
-        raise HTTPException(status_code=404, detail=f"Movie with id {movie_id} not found")
-
-    # Create new generated opinion
+    # Create new generated opinion; the movie_id foreign key checks that the movie exists
     new_opinion = GeneratedOpinion(
         movie_id=movie_id,
         content=opinion_data.content,
@@ -126,13 +231,22 @@ def add_absurd_opinion(
     )
 
     db.add(new_opinion)
-    db.commit()
-    db.refresh(new_opinion)
+    _commit_or_404(db, movie_id)
+    movie_title = _movie_title(db, movie_id)
+    opinion_ids.add(GeneratedOpinion, new_opinion.id, new_opinion.absurdity_score)
+    leaderboard.add(RankedOpinion(
+        id=new_opinion.id,
+        movie_id=new_opinion.movie_id,
+        movie_title=movie_title,
+        content=new_opinion.content,
+        absurdity_score=new_opinion.absurdity_score,
+        generation_method=new_opinion.generation_method
+    ))
 
     return GeneratedOpinionResponse(
         id=new_opinion.id,
         movie_id=new_opinion.movie_id,
-        movie_title=movie.title,
+        movie_title=movie_title,
         content=new_opinion.content,
         absurdity_score=new_opinion.absurdity_score,
         generation_method=new_opinion.generation_method,
@@ -153,12 +267,7 @@ def add_anonymous_review(
     Help fill in the gaps! If a movie doesn't have real reviews yet,
     you can submit your own honest take on it.
     """
-    # Check if movie exists
-    movie = db.query(Movie).filter(Movie.id == movie_id).first()
-    if not movie:
-        raise HTTPException(status_code=404, detail=f"Movie with id {movie_id} not found")
-
-    # Create new anonymous review
+    # Create new anonymous review; the movie_id foreign key checks that the movie exists
     new_review = ExternalReview(
         movie_id=movie_id,
         source=ReviewSource.USER,
@@ -168,13 +277,12 @@ def add_anonymous_review(
     )
 
     db.add(new_review)
-    db.commit()
-    db.refresh(new_review)
+    _commit_or_404(db, movie_id)
 
     return ReviewResponse(
         id=new_review.id,
         movie_id=new_review.movie_id,
-        movie_title=movie.title,
+        movie_title=_movie_title(db, movie_id),
         source=new_review.source.value,
         author=new_review.author,
         content=new_review.content,
@@ -183,6 +291,113 @@ def add_anonymous_review(
     )
 
 
+@router.post("/batch/absurd-opinions", response_model=BatchCreateResponse)
+def add_absurd_opinions_in_batch(
+    batch: BatchGeneratedOpinionCreate,
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key)
+):
+    """
+    Create up to 5000 absurd/generated opinions, across any number of movies.
+
+    Meant for generation pipelines: one query checks every referenced movie,
+    the opinions go in with multi-row INSERTs and one commit. Each opinion gets
+    a status in request order: created (with its id) or not_found.
+    """
+    titles = movie_titles(db, (item.movie_id for item in batch.opinions))
+    now = datetime.utcnow()
+    found = [item for item in batch.opinions if item.movie_id in titles]
+    rows = [
+        {
+            "movie_id": item.movie_id,
+            "content": item.content,
+            "absurdity_score": item.absurdity_score,
+            "generation_method": item.generation_method or "manual",
+            "created_at": now
+        }
+        for item in found
+    ]
+    ids = _insert_batch(db, GeneratedOpinion, rows)
+
+    for item, row, opinion_id in zip(found, rows, ids):
+        if opinion_id is None:
+            # No ids back from the INSERT (MySQL): the next read resyncs the leaderboard
+            leaderboard.invalidate()
+            break
+        opinion_ids.add(GeneratedOpinion, opinion_id, item.absurdity_score)
+        leaderboard.add(RankedOpinion(
+            id=opinion_id,
+            movie_id=item.movie_id,
+            movie_title=titles[item.movie_id],
+            content=item.content,
+            absurdity_score=item.absurdity_score,
+            generation_method=row["generation_method"]
+        ))
+
+    return _batch_response(batch.opinions, titles, ids)
+
+
+@router.post("/batch/reviews", response_model=BatchCreateResponse)
+def add_reviews_in_batch(
+    batch: BatchReviewCreate,
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key)
+):
+    """
+    Submit up to 5000 anonymous reviews, across any number of movies.
+
+    One query checks every referenced movie, the reviews go in with multi-row
+    INSERTs and one commit. Each review gets a status in request order:
+    created (with its id) or not_found.
+    """
+    titles = movie_titles(db, (item.movie_id for item in batch.reviews))
+    now = datetime.utcnow()
+    rows = [
+        {
+            "movie_id": item.movie_id,
+            "source": ReviewSource.USER,
+            "author": item.author if item.author else "Anonymous",
+            "content": item.content,
+            "rating": item.rating,
+            "created_at": now
+        }
+        for item in batch.reviews if item.movie_id in titles
+    ]
+    ids = _insert_batch(db, ExternalReview, rows)
+    return _batch_response(batch.reviews, titles, ids)
+
+
+def _insert_batch(db: Session, model, rows: List[dict]) -> List[Optional[int]]:
+    """insert_rows() and commit; a movie deleted since the check turns into a 409."""
+    try:
+        ids = insert_rows(db, model.__table__, rows)
+        db.commit()
+    except IntegrityError as error:
+        db.rollback()
+        if is_foreign_key_violation(error):
+            raise HTTPException(
+                status_code=409,
+                detail="Some of these movies were deleted by another request, please retry"
+            )
+        raise
+    return ids
+
+
+def _batch_response(items, titles: dict, ids: List[Optional[int]]) -> BatchCreateResponse:
+    created = iter(ids)
+    results = [
+        BatchCreateResult(movie_id=item.movie_id, status=ROW_CREATED, id=next(created))
+        if item.movie_id in titles
+        else BatchCreateResult(movie_id=item.movie_id, status=ROW_NOT_FOUND)
+        for item in items
+    ]
+    return BatchCreateResponse(
+        results=results,
+        created=len(ids),
+        not_found=len(results) - len(ids)
+    )
+
+
 @router.post("/", response_model=MovieResponse, status_code=201)
 def create_movie(
     movie_data: MovieCreate,
@@ -220,52 +435,131 @@ def create_movie(
         backdrop_url=movie_data.backdrop_url
     )
 
-    # Handle genres
-    for genre_name in movie_data.genre_names:
-        # Try to find existing genre or create new one
-        genre = db.query(Genre).filter(Genre.name == genre_name).first()
-        if not genre:
-            genre = Genre(name=genre_name)
-            db.add(genre)
-        new_movie.genres.append(genre)
+    # Genre ids come from the per-worker registry: no query per genre name
+    genres = list(genre_registry.ids_for_names(db, movie_data.genre_names).values())
 
+    # The flush gets the new id (INSERT ... RETURNING / lastrowid); the session
+    # keeps every value after the commit, so no refresh is needed
     db.add(new_movie)
+    db.flush()
+    link_genres(db, new_movie.id, [genre.id for genre in genres])
     db.commit()
-    db.refresh(new_movie)
 
-    return new_movie
+    register_movie(new_movie, [genre.name for genre in genres])
+
+    return MovieResponse(
+        id=new_movie.id,
+        title=new_movie.title,
+        original_title=new_movie.original_title,
+        overview=new_movie.overview,
+        release_date=new_movie.release_date,
+        runtime=new_movie.runtime,
+        poster_url=new_movie.poster_url,
+        backdrop_url=new_movie.backdrop_url,
+        vote_average=new_movie.vote_average,
+        vote_count=new_movie.vote_count,
+        genres=[GenreSchema(id=genre.id, name=genre.name) for genre in genres]
+    )
+
+
+@router.post("/import")
+async def import_movies(
+    request: Request,
+    api_key: str = Security(verify_api_key)
+):
+    """
+    Bulk-import movies from NDJSON (Content-Type: application/x-ndjson).
+
+    One JSON object per line, with the same fields as POST /pelicula/. The body
+    is read as it arrives and stored in chunks of IMPORT_CHUNK_SIZE movies, each
+    in its own transaction. Titles already in the catalog (as title or original
+    title, case-insensitive) or repeated in the payload are skipped.
+
+    Returns an NDJSON report: one record per line (created with its id,
+    duplicate, or error with the reason), a progress record after each chunk,
+    and a final summary.
+
+    The report only starts once the whole body has been stored, so the client
+    sees no progress while it uploads, and a proxy idle timeout shorter than
+    the import cuts the response off (the imported chunks stay committed).
+    Split very large catalogs over several requests, or follow the progress
+    in the server log. Until it is sent, the report is kept in a temporary
+    file rather than in memory.
+    """
+    movie_import = MovieImport()
+    try:
+        async for number, line in ndjson_lines(request.stream()):
+            if movie_import.add_line(number, line):
+                await run_in_threadpool(movie_import.store_pending)
+        await run_in_threadpool(movie_import.store_pending)
+    except BaseException:
+        movie_import.close()
+        raise
+
+    return StreamingResponse(movie_import.report(), media_type="application/x-ndjson")
 
 
 @router.get("/search", response_model=List[MovieResponse])
 def search_movies(
+    response: Response,
     q: str = Query(..., min_length=1, description="Search query for movie title"),
-    limit: int = Query(default=10, ge=1, le=50, description="Maximum number of results"),
-    db: Session = Depends(get_db)
+    limit: int = Query(default=10, ge=1, le=50, description="Maximum number of results per page"),
+    fuzzy: bool = Query(default=False, description="Tolerate typos (e.g. 'interstelar')"),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_read_db)
 ):
     """
     Search for movies by title.
 
-    Returns movies that match the search query in their title or original title.
-    """
-    search_pattern = f"%{q}%"
-
-    movies = db.query(Movie).filter(
-        or_(
-            Movie.title.ilike(search_pattern),
-            Movie.original_title.ilike(search_pattern)
-        )
-    ).limit(limit).all()
+    Returns movies that match the search query in their title or original title,
+    best matches first (full-text / trigram indexes, see services/search.py).
+    With fuzzy=true, titles within a few typos of the query match too.
 
-    if not movies:
+    When more results exist, the X-Next-Cursor response header holds the cursor
+    for the next page.
+    """
+    next_cursor = None
+    if fuzzy:
+        offset = int(decode_cursor(cursor, 1)[0]) if cursor else 0
+        movies = find_movies_fuzzy(db, q, limit + 1, offset)
+        if len(movies) > limit:
+            movies = movies[:limit]
+            next_cursor = encode_cursor([offset + limit])
+    else:
+        after = decode_cursor(cursor, 2) if cursor else None
+        rows = find_movies_by_title(db, q, limit + 1, after)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_movie, last_relevance = rows[-1]
+            next_cursor = encode_cursor([last_relevance, last_movie.id])
+        movies = [movie for movie, _ in rows]
+
+    # Only the first page reports "nothing found"; a later page may just be empty
+    if not movies and cursor is None:
         raise HTTPException(status_code=404, detail=f"No movies found matching '{q}'")
 
+    set_next_cursor(response, next_cursor)
     return movies
 
 
+@router.get("/autocomplete", response_model=List[AutocompleteSuggestion])
+def autocomplete_movies(
+    q: str = Query(..., min_length=1, max_length=255, description="What the user has typed so far"),
+    limit: int = Query(default=10, ge=1, le=MAX_SUGGESTIONS, description="Maximum number of suggestions")
+):
+    """
+    Suggest movie titles for a search-as-you-type box.
+
+    Matches the start of any word in the title or original title (accents and
+    case ignored), most popular first. Served from memory, no database access.
+    """
+    return [suggestion._asdict() for suggestion in autocomplete_index.suggest(q, limit)]
+
+
 @router.get("/{movie_id}", response_model=MovieDetailResponse)
 def get_movie_by_id(
     movie_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get a specific movie by its ID.
@@ -277,17 +571,9 @@ def get_movie_by_id(
     if not movie:
         raise HTTPException(status_code=404, detail=f"Movie with id {movie_id} not found")
 
-    # Get a random real review (if exists)
-    real_review_text = None
-    if movie.external_reviews:
-        random_review = random.choice(movie.external_reviews)
-        real_review_text = random_review.content
-
-    # Get a random fake opinion
-    fake_opinion_text = "This movie is unreliable... like a unicorn!"
-    if movie.generated_opinions:
-        random_opinion = random.choice(movie.generated_opinions)
-        fake_opinion_text = random_opinion.content
+    # Pick a random real review (if exists) and a random fake opinion in SQL
+    real_review_text = random_review_texts(db, [movie.id]).get(movie.id)
+    fake_opinion_text = random_opinion_texts(db, [movie.id]).get(movie.id, DEFAULT_FAKE_OPINION)
 
     return MovieDetailResponse(
         id=movie.id,
@@ -304,3 +590,33 @@ def get_movie_by_id(
         real_review=real_review_text,
         fake_opinion=fake_opinion_text
     )
+
+
+@router.get("/{movie_id}/opinions", response_model=List[TopUserOpinionResponse])
+def get_movie_user_opinions(
+    movie_id: int,
+    response: Response,
+    limit: int = Query(default=10, ge=1, le=100, description="Number of opinions to return per page"),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Lists the opinions users submitted for a movie, most up-voted first.
+
+    Ranked by vote balance (UP minus DOWN votes). When more opinions exist, the
+    X-Next-Cursor response header holds the cursor for the next page.
+    """
+    after = decode_cursor(cursor, 2) if cursor else None
+    results = ranked_user_opinions(db, limit + 1, after, movie_id=movie_id)
+
+    # Only an empty first page needs to tell "no opinions yet" from "no such movie"
+    if not results and not cursor and db.query(Movie.id).filter(Movie.id == movie_id).first() is None:
+        raise HTTPException(status_code=404, detail=f"Movie with id {movie_id} not found")
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor([results[-1].vote_balance, results[-1].id])
+    set_next_cursor(response, next_cursor)
+
+    return user_opinion_responses(results)
@@ -1,59 +1,57 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
-from typing import List
+from sqlalchemy import and_, or_
+from typing import List, Optional, Sequence
 
-from models import GeneratedOpinion, Movie, OpinionVote, VoteType
-from schemas.opinion import TopOpinionResponse
-from database import get_db
+from models import GeneratedOpinion, Movie
+from schemas.opinion import OpinionKind, TopOpinionResponse, TopUserOpinionResponse, TrendingOpinionResponse
+from database import get_read_db
+from services.leaderboard import leaderboard
+from services.pagination import encode_cursor, decode_cursor, set_next_cursor
+from services.trending import trending_opinions
+from services.votes import ranked_user_opinions, user_opinion_responses
 
 router = APIRouter(prefix="/opiniones", tags=["opinions"])
 
 
 @router.get("/top", response_model=List[TopOpinionResponse])
 def get_top_opinions(
-    limit: int = Query(default=10, ge=1, le=100, description="Number of opinions to return"),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(default=10, ge=1, le=100, description="Number of opinions to return per page"),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_read_db)
 ):
     """
     Lists the top absurd or most up-voted generated opinions.
 
     Ranked by a combination of absurdity score and vote balance.
     Because the best opinions are the ones that make you question reality!
+
+    When more opinions exist, the X-Next-Cursor response header holds the cursor
+    for the next page.
     """
-    # Build query with vote counts
-    opinions_query = db.query(
-        GeneratedOpinion.id,
-        GeneratedOpinion.movie_id,
-        Movie.title.label("movie_title"),
-        GeneratedOpinion.content,
-        GeneratedOpinion.absurdity_score,
-        GeneratedOpinion.generation_method,
-        func.count(OpinionVote.id).label("vote_count"),
-        func.sum(case((OpinionVote.vote_type == VoteType.UP, 1), else_=0)).label("up_votes"),
-        func.sum(case((OpinionVote.vote_type == VoteType.DOWN, 1), else_=0)).label("down_votes"),
-        func.sum(case((OpinionVote.vote_type == VoteType.LOL, 1), else_=0)).label("lol_votes"),
-        func.sum(case((OpinionVote.vote_type == VoteType.WTF, 1), else_=0)).label("wtf_votes"),
-    ).join(
-        Movie, GeneratedOpinion.movie_id == Movie.id
-    ).outerjoin(
-        OpinionVote, GeneratedOpinion.id == OpinionVote.generated_opinion_id
-    ).group_by(
-        GeneratedOpinion.id,
-        Movie.title
-    ).order_by(
-        # Sort by absurdity score first, then by vote balance
-        GeneratedOpinion.absurdity_score.desc(),
-        (func.sum(case((OpinionVote.vote_type == VoteType.UP, 1), else_=0)) -
-         func.sum(case((OpinionVote.vote_type == VoteType.DOWN, 1), else_=0))).desc()
-    ).limit(limit)
+    after = decode_cursor(cursor, 3) if cursor else None
+
+    # Pages within the top LEADERBOARD_SIZE opinions are served from memory
+    leaderboard.ensure_loaded(db)
+    cached_page = leaderboard.page(limit, after)
+    if cached_page is not None:
+        results, has_more = cached_page
+    else:
+        results = _top_opinion_rows(db, limit + 1, after)
+        has_more = len(results) > limit
+        results = results[:limit]
 
-    results = opinions_query.all()
+    next_cursor = None
+    if has_more:
+        last = results[-1]
+        next_cursor = encode_cursor([last.absurdity_score, last.vote_balance, last.id])
+    set_next_cursor(response, next_cursor)
 
     # Format response
-    response = []
+    opinions = []
     for row in results:
-        response.append(TopOpinionResponse(
+        opinions.append(TopOpinionResponse(
             id=row.id,
             movie_id=row.movie_id,
             movie_title=row.movie_title,
@@ -67,4 +65,90 @@ def get_top_opinions(
             wtf_votes=row.wtf_votes or 0
         ))
 
-    return response
+    return opinions
+
+
+@router.get("/user/top", response_model=List[TopUserOpinionResponse])
+def get_top_user_opinions(
+    response: Response,
+    limit: int = Query(default=10, ge=1, le=100, description="Number of opinions to return per page"),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Lists the opinions submitted by users, most up-voted first.
+
+    Ranked by vote balance (UP minus DOWN votes). When more opinions exist, the
+    X-Next-Cursor response header holds the cursor for the next page.
+    """
+    after = decode_cursor(cursor, 2) if cursor else None
+    results = ranked_user_opinions(db, limit + 1, after)
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor([results[-1].vote_balance, results[-1].id])
+    set_next_cursor(response, next_cursor)
+
+    return user_opinion_responses(results)
+
+
+@router.get("/trending", response_model=List[TrendingOpinionResponse])
+def get_trending_opinions(
+    limit: int = Query(default=10, ge=1, le=100, description="Number of opinions to return"),
+    kind: Optional[OpinionKind] = Query(default=None, description="Only generated or only user opinions"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Lists the opinions collecting the most votes right now.
+
+    Every vote counts, but recent ones count more: a vote's weight halves every
+    TRENDING_HALF_LIFE_HOURS (24 by default) and DOWN votes count against the
+    opinion. Covers both generated and user opinions unless `kind` is given.
+    """
+    return [
+        TrendingOpinionResponse(**opinion._asdict())
+        for opinion in trending_opinions(db, limit, kind)
+    ]
+
+
+def _top_opinion_rows(db: Session, limit: int, after: Optional[Sequence] = None):
+    """Top opinions read from the database, ranked after the cursor values `after`."""
+    # Vote counters live on the opinion row, so this is a range read of
+    # ix_generated_opinions_absurdity_balance rather than an aggregation of opinion_votes
+    opinions_query = db.query(
+        GeneratedOpinion.id,
+        GeneratedOpinion.movie_id,
+        Movie.title.label("movie_title"),
+        GeneratedOpinion.content,
+        GeneratedOpinion.absurdity_score,
+        GeneratedOpinion.generation_method,
+        GeneratedOpinion.vote_count,
+        GeneratedOpinion.up_votes,
+        GeneratedOpinion.down_votes,
+        GeneratedOpinion.lol_votes,
+        GeneratedOpinion.wtf_votes,
+        GeneratedOpinion.vote_balance,
+    ).join(
+        Movie, GeneratedOpinion.movie_id == Movie.id
+    )
+
+    if after is not None:
+        # Continue after the last opinion of the previous page
+        last_score, last_balance, last_id = after
+        opinions_query = opinions_query.filter(
+            GeneratedOpinion.absurdity_score <= last_score,
+            or_(
+                GeneratedOpinion.absurdity_score < last_score,
+                and_(GeneratedOpinion.absurdity_score == last_score, GeneratedOpinion.vote_balance < last_balance),
+                and_(GeneratedOpinion.absurdity_score == last_score, GeneratedOpinion.vote_balance == last_balance,
+                     GeneratedOpinion.id < last_id)
+            )
+        )
+
+    return opinions_query.order_by(
+        # Sort by absurdity score first, then by vote balance (id breaks ties)
+        GeneratedOpinion.absurdity_score.desc(),
+        GeneratedOpinion.vote_balance.desc(),
+        GeneratedOpinion.id.desc()
+    ).limit(limit).all()
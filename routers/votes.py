@@ -1,20 +1,38 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, Security
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Security
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import datetime
 from typing import Optional
+import queue
 
-from models import GeneratedOpinion, UserOpinion, OpinionVote
-from schemas.vote import VoteCreate, VoteResponse
-from database import get_db
+from models import GeneratedOpinion, UserOpinion
+from schemas.opinion import OpinionKind
+from schemas.vote import BatchVoteCreate, BatchVoteResponse, BatchVoteResult, VoteCreate, VoteResponse
+from database import get_db, is_foreign_key_violation
 from auth import verify_api_key
+from services.leaderboard import leaderboard
+from services.votes import (
+    PendingVote, DuplicateVoteError, VOTE_CREATED, VOTE_CHANGED, VOTE_DUPLICATE, VOTE_NOT_FOUND,
+    find_opinions, record_vote, record_votes
+)
+from services.vote_buffer import VOTE_BUFFER_ENABLED, opinion_ids, vote_buffer
 
 router = APIRouter(prefix="/vote", tags=["votes"])
 
+# Opinion model voted on for each kind
+KIND_MODELS = {
+    OpinionKind.GENERATED: GeneratedOpinion,
+    OpinionKind.USER: UserOpinion,
+}
+
 
 @router.post("/opinion/{opinion_id}", response_model=VoteResponse, status_code=201)
 def vote_on_generated_opinion(
     opinion_id: int,
     vote_data: VoteCreate,
     request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     api_key: str = Security(verify_api_key)
 ):
@@ -26,32 +44,28 @@ def vote_on_generated_opinion(
     - DOWN: You didn't like it
     - LOL: It made you laugh
     - WTF: It's so absurd you can't even
-    """
-    # Check if opinion exists
-    opinion = db.query(GeneratedOpinion).filter(GeneratedOpinion.id == opinion_id).first()
-    if not opinion:
-        raise HTTPException(status_code=404, detail=f"Generated opinion with id {opinion_id} not found")
 
+    Each voter (voter_identifier, or the client IP) has one vote per opinion:
+    voting again with another type changes it (200), repeating it returns 409.
+
+    With write-behind ingestion enabled (VOTE_BUFFER_ENABLED), the vote is
+    queued and stored within a fraction of a second: the response is 202 without an id.
+    """
     # Use provided voter_identifier or fall back to IP address
     voter_id = vote_data.voter_identifier or request.client.host
 
-    # Create vote
-    new_vote = OpinionVote(
-        generated_opinion_id=opinion_id,
-        vote_type=vote_data.vote_type,
-        voter_identifier=voter_id
-    )
-
-    db.add(new_vote)
-    db.commit()
-    db.refresh(new_vote)
+    if VOTE_BUFFER_ENABLED:
+        return _queue_vote(GeneratedOpinion, "Generated opinion", opinion_id, vote_data, voter_id, response, db)
 
-    return VoteResponse(
-        id=new_vote.id,
-        opinion_id=opinion_id,
-        vote_type=new_vote.vote_type,
-        message=f"Your {vote_data.vote_type.value.upper()} vote has been registered!"
+    # Create or change the vote (also updates the opinion's counters and trending bucket).
+    # The opinion_id foreign key checks that the opinion exists; the counter
+    # UPDATE returns the absurdity score the leaderboard needs.
+    new_vote, deltas, absurdity_score = _store_vote(
+        db, GeneratedOpinion, "Generated opinion", opinion_id, vote_data, voter_id
     )
+    leaderboard.record_vote(opinion_id, absurdity_score, deltas)
+
+    return _vote_response(new_vote, deltas, opinion_id, vote_data, response)
 
 
 @router.post("/user-opinion/{opinion_id}", response_model=VoteResponse, status_code=201)
@@ -59,6 +73,7 @@ def vote_on_user_opinion(
     opinion_id: int,
     vote_data: VoteCreate,
     request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     api_key: str = Security(verify_api_key)
 ):
@@ -70,29 +85,152 @@ def vote_on_user_opinion(
     - DOWN: You didn't like it
     - LOL: It made you laugh
     - WTF: It's so absurd you can't even
-    """
-    # Check if opinion exists
-    opinion = db.query(UserOpinion).filter(UserOpinion.id == opinion_id).first()
-    if not opinion:
-        raise HTTPException(status_code=404, detail=f"User opinion with id {opinion_id} not found")
 
+    Each voter (voter_identifier, or the client IP) has one vote per opinion:
+    voting again with another type changes it (200), repeating it returns 409.
+
+    With write-behind ingestion enabled (VOTE_BUFFER_ENABLED), the vote is
+    queued and stored within a fraction of a second: the response is 202 without an id.
+    """
     # Use provided voter_identifier or fall back to IP address
     voter_id = vote_data.voter_identifier or request.client.host
 
-    # Create vote
-    new_vote = OpinionVote(
-        user_opinion_id=opinion_id,
-        vote_type=vote_data.vote_type,
-        voter_identifier=voter_id
+    if VOTE_BUFFER_ENABLED:
+        return _queue_vote(UserOpinion, "User opinion", opinion_id, vote_data, voter_id, response, db)
+
+    # Create or change the vote (also updates the opinion's counters and trending bucket);
+    # the user_opinion_id foreign key checks that the opinion exists
+    new_vote, deltas, _ = _store_vote(db, UserOpinion, "User opinion", opinion_id, vote_data, voter_id)
+
+    return _vote_response(new_vote, deltas, opinion_id, vote_data, response)
+
+
+@router.post("/batch", response_model=BatchVoteResponse)
+def vote_in_batch(
+    batch: BatchVoteCreate,
+    request: Request,
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key)
+):
+    """
+    Store up to 5000 votes on generated and user opinions at once.
+
+    Meant for clients that collect votes offline: one request, one query
+    checking every referenced opinion, one multi-row INSERT and one commit.
+    Votes are stored directly, whether or not write-behind ingestion is enabled.
+
+    Each vote gets a status, in request order:
+    - created: a new vote
+    - changed: replaced the voter's earlier vote on the opinion
+    - duplicate: the voter already cast exactly this vote (also within the batch)
+    - not_found: the opinion doesn't exist
+    """
+    client_id = request.client.host
+    votes = [
+        PendingVote(KIND_MODELS[item.kind], item.opinion_id, item.vote_type,
+                    item.voter_identifier or client_id, datetime.utcnow())
+        for item in batch.votes
+    ]
+
+    # One query for every opinion referenced by the batch
+    opinions = find_opinions(db, {(vote.model, vote.opinion_id) for vote in votes})
+    found = [vote for vote in votes if (vote.model, vote.opinion_id) in opinions]
+
+    try:
+        stored, counters = record_votes(db, found)
+        db.commit()
+    except (IntegrityError, StaleDataError):
+        # Raced with another request of the same voters, or an opinion was deleted
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="Some of these votes were changed by another request, please retry"
+        )
+
+    for (model, opinion_id), deltas in counters.items():
+        if model is GeneratedOpinion:
+            leaderboard.record_vote(opinion_id, opinions[(model, opinion_id)], deltas)
+
+    statuses = iter(stored)
+    results = []
+    for item, vote in zip(batch.votes, votes):
+        if (vote.model, vote.opinion_id) in opinions:
+            status = next(statuses)
+        else:
+            status = VOTE_NOT_FOUND
+        results.append(BatchVoteResult(
+            kind=item.kind,
+            opinion_id=item.opinion_id,
+            vote_type=item.vote_type,
+            status=status
+        ))
+
+    return BatchVoteResponse(
+        results=results,
+        created=sum(result.status == VOTE_CREATED for result in results),
+        changed=sum(result.status == VOTE_CHANGED for result in results),
+        duplicate=sum(result.status == VOTE_DUPLICATE for result in results),
+        not_found=sum(result.status == VOTE_NOT_FOUND for result in results)
     )
 
-    db.add(new_vote)
-    db.commit()
-    db.refresh(new_vote)
 
+def _store_vote(db: Session, model, label: str, opinion_id: int, vote_data: VoteCreate, voter_id: str):
+    """record_vote() and commit, turning a missing opinion into a 404 and a repeated vote into a 409."""
+    try:
+        stored = record_vote(db, model, opinion_id, vote_data.vote_type, voter_id)
+        db.commit()
+    except DuplicateVoteError:
+        db.rollback()
+        raise _duplicate_vote(vote_data)
+    except IntegrityError as error:
+        db.rollback()
+        if is_foreign_key_violation(error):
+            raise HTTPException(status_code=404, detail=f"{label} with id {opinion_id} not found")
+        raise
+    return stored
+
+
+def _vote_response(new_vote, deltas, opinion_id: int, vote_data: VoteCreate, response: Response) -> VoteResponse:
+    # A changed vote leaves vote_count as it was
+    if deltas.get("vote_count"):
+        message = f"Your {vote_data.vote_type.value.upper()} vote has been registered!"
+    else:
+        response.status_code = 200
+        message = f"Your vote has been changed to {vote_data.vote_type.value.upper()}!"
     return VoteResponse(
         id=new_vote.id,
         opinion_id=opinion_id,
         vote_type=new_vote.vote_type,
-        message=f"Your {vote_data.vote_type.value.upper()} vote has been registered!"
+        message=message
+    )
+
+
+def _duplicate_vote(vote_data: VoteCreate) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"You already cast a {vote_data.vote_type.value.upper()} vote on this opinion"
+    )
+
+
+def _queue_vote(model, label: str, opinion_id: int, vote_data: VoteCreate, voter_id: str,
+                response: Response, db: Session) -> VoteResponse:
+    """Validate against the cached opinion ids and hand the vote to the write-behind buffer."""
+    if not opinion_ids.contains(db, model, opinion_id):
+        raise HTTPException(status_code=404, detail=f"{label} with id {opinion_id} not found")
+
+    try:
+        vote_buffer.submit(PendingVote(model, opinion_id, vote_data.vote_type, voter_id, datetime.utcnow()))
+    except queue.Full:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many votes waiting to be stored, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    response.status_code = 202
+    return VoteResponse(
+        id=None,
+        opinion_id=opinion_id,
+        vote_type=vote_data.vote_type,
+        message=f"Your {vote_data.vote_type.value.upper()} vote has been queued!"
     )
@@ -1,6 +1,12 @@
 from typing import Optional, List, Union
 from pydantic import BaseModel, validator, Field, HttpUrl
 from datetime import date
+import enum
+
+
+class RandomWeighting(str, enum.Enum):
+    """How /pelicula/random weighs movies (uniform when not given)"""
+    POPULARITY = "popularity"
 
 
 class GenreSchema(BaseModel):
@@ -60,10 +66,24 @@ class RandomMovieResponse(BaseModel):
     real_review: Optional[str] = None
     fake_opinion: str
 
+    @validator('release_date', pre=True)
+    def convert_date_to_string(cls, v):
+        if isinstance(v, date):
+            return v.isoformat()
+        return v
+
     class Config:
         from_attributes = True
 
 
+class AutocompleteSuggestion(BaseModel):
+    """One suggestion from GET /pelicula/autocomplete"""
+    id: int
+    title: str
+    original_title: Optional[str]
+    popularity: float = 0.0
+
+
 class MovieDetailResponse(BaseModel):
     """Response for GET /pelicula/{id} with reviews and opinions"""
     id: int
@@ -1,5 +1,15 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
+import enum
+
+# Most opinions or reviews accepted by one batch request
+MAX_BATCH_ITEMS = 5000
+
+
+class OpinionKind(str, enum.Enum):
+    """Generated (absurd) opinions or opinions submitted by users"""
+    GENERATED = "generated"
+    USER = "user"
 
 
 class OpinionCreate(BaseModel):
@@ -15,6 +25,30 @@ class GeneratedOpinionCreate(BaseModel):
     generation_method: Optional[str] = Field(None, max_length=100, description="How it was generated (e.g., 'manual', 'template', 'llm')")
 
 
+class BatchGeneratedOpinionItem(GeneratedOpinionCreate):
+    """One opinion of a POST /pelicula/batch/absurd-opinions request"""
+    movie_id: int
+
+
+class BatchGeneratedOpinionCreate(BaseModel):
+    """Schema for creating many generated opinions, across any number of movies"""
+    opinions: List[BatchGeneratedOpinionItem] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+
+class BatchCreateResult(BaseModel):
+    """Outcome of one item of a batch, in request order"""
+    movie_id: int
+    status: str  # created or not_found
+    id: Optional[int] = None  # None if not created, or if the database can't return ids of a bulk INSERT (SQLite, MySQL)
+
+
+class BatchCreateResponse(BaseModel):
+    """Response after storing a batch of opinions or reviews"""
+    results: List[BatchCreateResult]
+    created: int
+    not_found: int
+
+
 class OpinionResponse(BaseModel):
     """Response after creating an opinion"""
     id: int
@@ -58,3 +92,38 @@ class TopOpinionResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class TopUserOpinionResponse(BaseModel):
+    """Response for user opinions ranked by votes"""
+    id: int
+    movie_id: int
+    movie_title: str
+    author_name: Optional[str]
+    content: str
+    created_at: str
+    vote_count: int = 0
+    up_votes: int = 0
+    down_votes: int = 0
+    lol_votes: int = 0
+    wtf_votes: int = 0
+
+    class Config:
+        from_attributes = True
+
+
+class TrendingOpinionResponse(BaseModel):
+    """Response for trending opinions"""
+    id: int
+    kind: OpinionKind
+    movie_id: int
+    movie_title: str
+    content: str
+    trending_score: float
+    recent_votes: int = 0
+    author_name: Optional[str] = None
+    absurdity_score: Optional[float] = None
+    generation_method: Optional[str] = None
+
+    class Config:
+        from_attributes = True
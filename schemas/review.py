@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
+from schemas.opinion import MAX_BATCH_ITEMS
 
 
 class ReviewCreate(BaseModel):
@@ -9,6 +10,16 @@ class ReviewCreate(BaseModel):
     rating: Optional[str] = Field(None, max_length=50, description="Optional rating (e.g., '4/5', '8/10')")
 
 
+class BatchReviewItem(ReviewCreate):
+    """One review of a POST /pelicula/batch/reviews request"""
+    movie_id: int
+
+
+class BatchReviewCreate(BaseModel):
+    """Schema for creating many anonymous reviews, across any number of movies"""
+    reviews: List[BatchReviewItem] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+
 class ReviewResponse(BaseModel):
     """Schema for review response"""
     id: int
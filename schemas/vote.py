@@ -1,5 +1,10 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 from models.vote import VoteType
+from schemas.opinion import OpinionKind
+
+# Most votes accepted by one POST /vote/batch request
+MAX_BATCH_VOTES = 5000
 
 
 class VoteCreate(BaseModel):
@@ -10,10 +15,40 @@ class VoteCreate(BaseModel):
 
 class VoteResponse(BaseModel):
     """Response after voting"""
-    id: int
+    id: Optional[int] = None  # None while the vote is queued for write-behind storage
     opinion_id: int
     vote_type: VoteType
     message: str = "Vote registered successfully!"
 
     class Config:
         from_attributes = True
+
+
+class BatchVoteItem(BaseModel):
+    """One vote of a POST /vote/batch request"""
+    kind: OpinionKind
+    opinion_id: int
+    vote_type: VoteType
+    voter_identifier: Optional[str] = None  # Defaults to the client IP
+
+
+class BatchVoteCreate(BaseModel):
+    """Schema for storing many votes at once"""
+    votes: List[BatchVoteItem] = Field(..., min_length=1, max_length=MAX_BATCH_VOTES)
+
+
+class BatchVoteResult(BaseModel):
+    """Outcome of one vote of a batch, in request order"""
+    kind: OpinionKind
+    opinion_id: int
+    vote_type: VoteType
+    status: str  # created, changed, duplicate or not_found
+
+
+class BatchVoteResponse(BaseModel):
+    """Response after storing a batch of votes"""
+    results: List[BatchVoteResult]
+    created: int
+    changed: int
+    duplicate: int
+    not_found: int
@@ -0,0 +1,144 @@
+"""
+Weighted sampling with Walker/Vose alias tables.
+
+An alias table answers "pick an item with probability proportional to its
+weight" in O(1) after an O(n) build. WeightedSampler adds cheap updates on top:
+new or re-weighted items go to a small append-only overflow area and the table
+is only rebuilt once that area (plus the entries it made stale) grows past a
+fraction of the catalog.
+"""
+import bisect
+import random
+from typing import Dict, Hashable, List, Optional, Sequence
+
+# Sentinel stored in WeightedSampler._current for items that live in the table
+_IN_TABLE = -1
+
+
+class AliasTable:
+    """Immutable alias table over `items` with the given non-negative weights."""
+
+    def __init__(self, items: Sequence[Hashable], weights: Sequence[float]):
+        self.items = list(items)
+        self.total = float(sum(weights))
+        size = len(self.items)
+        self._probability = [1.0] * size
+        self._alias = list(range(size))
+
+        if size == 0 or self.total <= 0:
+            return
+
+        scaled = [weight * size / self.total for weight in weights]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Whatever is left is 1.0 up to floating point error
+        for i in small + large:
+            self._probability[i] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self):
+        """Return one item, or None if the table has no weight."""
+        if not self.items or self.total <= 0:
+            return None
+        i = random.randrange(len(self.items))
+        if random.random() < self._probability[i]:
+            return self.items[i]
+        return self.items[self._alias[i]]
+
+
+class WeightedSampler:
+    """
+    Alias table plus an append-only overflow area for incremental updates.
+
+    Draws are exact: the table and the overflow area are picked in proportion
+    to their weight, and entries that were superseded by a later update are
+    rejected and redrawn.
+    """
+
+    def __init__(self, rebuild_ratio: float = 0.1, min_rebuild: int = 256):
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self._weights: Dict[Hashable, float] = {}
+        self._table = AliasTable([], [])
+        self._current: Dict[Hashable, int] = {}  # item -> _IN_TABLE or overflow position
+        self._overflow_items: List[Hashable] = []
+        self._overflow_cumulative: List[float] = []
+        self._superseded = 0  # entries (table or overflow) that no longer count
+
+    def __len__(self):
+        return len(self._weights)
+
+    def weight(self, item: Hashable) -> float:
+        """Current weight of an item (0.0 if it is not drawable)."""
+        return self._weights.get(item, 0.0)
+
+    def rebuild(self, weights: Optional[Dict[Hashable, float]] = None):
+        """Rebuild the table from scratch, optionally replacing all weights."""
+        if weights is not None:
+            self._weights = {item: weight for item, weight in weights.items() if weight > 0}
+        items = list(self._weights)
+        self._table = AliasTable(items, [self._weights[item] for item in items])
+        self._current = dict.fromkeys(items, _IN_TABLE)
+        self._overflow_items = []
+        self._overflow_cumulative = []
+        self._superseded = 0
+
+    def set_weight(self, item: Hashable, weight: float):
+        """Add an item or change its weight; a weight of zero removes it."""
+        if weight <= 0:
+            self.remove(item)
+            return
+        if item in self._current:
+            self._superseded += 1
+        self._weights[item] = weight
+        self._current[item] = len(self._overflow_items)
+        self._overflow_items.append(item)
+        previous = self._overflow_cumulative[-1] if self._overflow_cumulative else 0.0
+        self._overflow_cumulative.append(previous + weight)
+        self._maybe_rebuild()
+
+    def remove(self, item: Hashable):
+        """Stop drawing an item."""
+        if self._current.pop(item, None) is not None:
+            self._weights.pop(item, None)
+            self._superseded += 1
+            self._maybe_rebuild()
+
+    def draw(self, max_attempts: int = 64):
+        """Return an item with probability proportional to its weight, or None."""
+        if not self._weights:
+            return None
+        overflow_total = self._overflow_cumulative[-1] if self._overflow_cumulative else 0.0
+        total = self._table.total + overflow_total
+
+        for _ in range(max_attempts):
+            point = random.random() * total
+            if point < self._table.total:
+                item = self._table.draw()
+                if self._current.get(item) == _IN_TABLE:
+                    return item
+            else:
+                position = bisect.bisect_right(self._overflow_cumulative, point - self._table.total)
+                position = min(position, len(self._overflow_items) - 1)
+                item = self._overflow_items[position]
+                if self._current.get(item) == position:
+                    return item
+
+        # Too many superseded entries in the way: compact and draw again
+        self.rebuild()
+        return self._table.draw()
+
+    def _maybe_rebuild(self):
+        pending = len(self._overflow_items) + self._superseded
+        if pending > max(self.min_rebuild, self.rebuild_ratio * len(self._weights)):
+            self.rebuild()
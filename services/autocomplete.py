@@ -0,0 +1,142 @@
+"""
+In-process title autocomplete.
+
+Search-as-you-type needs an answer per keystroke, faster than a database round
+trip. Each worker keeps every normalized title and original title, plus every
+word-suffix of them ("the dark knight" -> "dark knight", "knight"), in one
+sorted array. A prefix lookup is two bisects; the matching slice is ranked by
+popularity. The index is built at startup (services/catalog.py) and updated
+when movies are created, so requests never touch the database.
+"""
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from models import Movie
+
+# Upper bound for ?limit= and the size of cached short-prefix answers
+MAX_SUGGESTIONS = 20
+
+# Prefixes this short match a large share of the catalog; their top results
+# are cached until the next rebuild, and inserts are merged into them
+CACHED_PREFIX_LENGTH = 3
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+def normalize_title(text: Optional[str]) -> str:
+    """Lower-case, strip accents and collapse punctuation to single spaces."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    ascii_text = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALPHANUMERIC.sub(" ", ascii_text.casefold()).strip()
+
+
+class Suggestion(NamedTuple):
+    id: int
+    title: str
+    original_title: Optional[str]
+    popularity: float
+
+
+class AutocompleteIndex:
+    """Sorted array of normalized title keys with popularity-ranked prefix lookups."""
+
+    def __init__(self):
+        self._keys: List[str] = []       # sorted normalized keys...
+        self._key_ids: List[int] = []    # ...and the movie each key belongs to
+        self._movies: Dict[int, Suggestion] = {}
+        self._cache: Dict[str, List[Suggestion]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._movies)
+
+    def reload(self, db: Session):
+        """Rebuild the index from the movies table."""
+        rows = db.query(Movie.id, Movie.title, Movie.original_title, Movie.popularity).all()
+
+        movies = {}
+        entries = []
+        for movie_id, title, original_title, popularity in rows:
+            movies[movie_id] = Suggestion(movie_id, title, original_title, popularity or 0.0)
+            entries.extend((key, movie_id) for key in _title_keys(title, original_title))
+        entries.sort()
+
+        with self._lock:
+            self._keys = [key for key, _ in entries]
+            self._key_ids = [movie_id for _, movie_id in entries]
+            self._movies = movies
+            self._cache = {}
+
+    def add(self, movie_id: int, title: str, original_title: Optional[str] = None, popularity: Optional[float] = None):
+        """Register a freshly inserted movie."""
+        with self._lock:
+            if movie_id in self._movies:
+                return
+            suggestion = Suggestion(movie_id, title, original_title, popularity or 0.0)
+            self._movies[movie_id] = suggestion
+            keys = _title_keys(title, original_title)
+            for key in keys:
+                offset = bisect.bisect_right(self._keys, key)
+                self._keys.insert(offset, key)
+                self._key_ids.insert(offset, movie_id)
+            # Merge the movie into the cached answers it now belongs to
+            prefixes = {key[:length] for key in keys for length in range(1, CACHED_PREFIX_LENGTH + 1)}
+            for prefix in prefixes & self._cache.keys():
+                self._cache[prefix] = _most_popular(self._cache[prefix] + [suggestion])
+
+    def title_of(self, movie_id: int) -> Optional[str]:
+        """Title of an indexed movie, or None if this worker hasn't indexed it (yet)."""
+        suggestion = self._movies.get(movie_id)
+        return suggestion.title if suggestion is not None else None
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Suggestion]:
+        """Up to `limit` movies with a title word starting with `prefix`, most popular first."""
+        key = normalize_title(prefix)
+        if not key:
+            return []
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                cached = self._top_matches(key)
+                if len(key) <= CACHED_PREFIX_LENGTH:
+                    self._cache[key] = cached
+        return cached[:limit]
+
+    def _top_matches(self, key: str) -> List[Suggestion]:
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_left(self._keys, key + "\uffff", start)
+        movie_ids = set(self._key_ids[start:end])
+        return _most_popular(self._movies[movie_id] for movie_id in movie_ids)
+
+
+def _most_popular(suggestions: Iterable[Suggestion]) -> List[Suggestion]:
+    """The MAX_SUGGESTIONS most popular suggestions, ties broken by lowest id."""
+    return heapq.nlargest(
+        MAX_SUGGESTIONS,
+        suggestions,
+        key=lambda suggestion: (suggestion.popularity, -suggestion.id)
+    )
+
+
+def _title_keys(title: Optional[str], original_title: Optional[str]) -> set:
+    """Every word-suffix of both normalized titles."""
+    keys = set()
+    for text in (title, original_title):
+        words = normalize_title(text).split(" ")
+        for i in range(len(words)):
+            if words[i]:
+                keys.add(" ".join(words[i:]))
+    return keys
+
+
+# One index per worker process
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,57 @@
+"""
+Bulk inserts for the batch endpoints (POST /pelicula/batch/...).
+
+Creating opinions one request at a time costs an INSERT and a commit each. The
+batch endpoints check every referenced movie with one query, then insert the
+rows with one multi-row INSERT per BULK_INSERT_CHUNK_SIZE rows and commit once.
+
+On PostgreSQL the generated ids come back with the INSERT itself, in row
+order (RETURNING, sorted on the serial id). MySQL has no RETURNING, and SQLite
+only returns ordered ids one row per statement, so there the rows are still
+inserted in bulk but their ids are not reported.
+"""
+import os
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+from models import Movie
+
+# Rows per multi-row INSERT statement
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "1000"))
+
+# Dialects returning the ids of a multi-row INSERT in row order
+RETURNING_DIALECTS = ("postgresql",)
+
+# Outcome of each item of a batch
+ROW_CREATED = "created"
+ROW_NOT_FOUND = "not_found"
+
+
+def movie_titles(db: Session, movie_ids: Iterable[int]) -> Dict[int, str]:
+    """Title of each existing movie among `movie_ids`, with one query."""
+    movie_ids = sorted(set(movie_ids))
+    if not movie_ids:
+        return {}
+    return dict(db.query(Movie.id, Movie.title).filter(Movie.id.in_(movie_ids)).all())
+
+
+def insert_rows(db: Session, table: Table, rows: List[dict]) -> List[Optional[int]]:
+    """
+    Insert rows with one multi-row INSERT per chunk (does not commit).
+
+    Returns:
+        the generated id of each row, in order; all None outside RETURNING_DIALECTS
+    """
+    returning = db.get_bind().dialect.name in RETURNING_DIALECTS
+    ids: List[Optional[int]] = []
+    for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + BULK_INSERT_CHUNK_SIZE]
+        if returning:
+            statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+            ids.extend(db.execute(statement, chunk).scalars())
+        else:
+            db.execute(insert(table), chunk)
+            ids.extend([None] * len(chunk))
+    return ids
@@ -0,0 +1,38 @@
+"""
+Keeps the per-worker catalog indexes in step with the movies table.
+
+The indexes (random-pick index, autocomplete, fuzzy title search) are built once at startup,
+updated in place when this worker creates a movie, and rebuilt periodically
+so movies created by other workers or scripts show up too.
+"""
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from models import Movie
+from services.movie_index import movie_index, MOVIE_INDEX_TTL_SECONDS
+from services.autocomplete import autocomplete_index
+from services.fuzzy import fuzzy_title_index
+
+logger = logging.getLogger(__name__)
+
+# How often the background task rebuilds the indexes
+CATALOG_REFRESH_SECONDS = MOVIE_INDEX_TTL_SECONDS
+
+
+def rebuild_catalog_indexes(db: Session):
+    """Rebuild every catalog index from the database."""
+    movie_index.reload(db)
+    autocomplete_index.reload(db)
+    fuzzy_title_index.reload(db)
+    logger.info("Catalog indexes rebuilt (%d movies)", len(movie_index))
+
+
+def register_movie(movie: Movie, genre_names: Optional[Iterable[str]] = None):
+    """Add a freshly inserted movie to every catalog index."""
+    if genre_names is None:
+        genre_names = [genre.name for genre in movie.genres]
+    movie_index.add(movie.id, movie.release_year, movie.vote_average, genre_names, movie.popularity)
+    autocomplete_index.add(movie.id, movie.title, movie.original_title, movie.popularity)
+    fuzzy_title_index.add(movie.id, movie.title, movie.original_title)
@@ -0,0 +1,165 @@
+"""
+Typo-tolerant title search with a character trigram index.
+
+Every normalized title and original title is split into padded character
+trigrams ("interstellar" -> "  i", " in", "int", ...). Postings are kept as
+compact `array('I')` lists of document numbers, so the index stays small for
+a large catalog. A query:
+
+1. counts shared trigrams per document by walking the query's posting lists,
+2. keeps the best candidates by Dice coefficient,
+3. confirms each candidate with a bounded edit distance against the closest
+   substring of the title, so "interstelar" finds "Interstellar" and
+   "dark knigt" finds "The Dark Knight".
+"""
+import heapq
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Movie
+from services.autocomplete import normalize_title
+
+# Candidates (by trigram overlap) that get the edit-distance check
+MAX_CANDIDATES = 200
+
+# Candidates sharing less than this Dice coefficient are not worth checking
+MIN_DICE = 0.2
+
+# Trigrams found in more than this share of the documents carry little signal
+# and are skipped when the query has enough other trigrams
+STOP_GRAM_RATIO = 0.1
+
+
+def trigrams(text: str) -> List[str]:
+    """Padded character trigrams of an already normalized string."""
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def allowed_edits(query: str) -> int:
+    """Typos tolerated for a query of this length."""
+    return max(1, len(query) // 4)
+
+
+def substring_edit_distance(query: str, text: str, limit: int) -> Optional[int]:
+    """
+    Edit distance between `query` and the closest substring of `text`.
+
+    Counts insertions, deletions, substitutions and swaps of adjacent
+    characters ("alein" -> "alien"). Returns None as soon as the distance is
+    known to exceed `limit`.
+    """
+    # row[j]: distance of query[:i] against a substring ending at text[:j];
+    # row 0 is all zeros because a match may start anywhere in the text
+    before_previous = None
+    previous = [0] * (len(text) + 1)
+    for i, query_char in enumerate(query, 1):
+        current = [i] + [0] * len(text)
+        for j, text_char in enumerate(text, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (query_char != text_char)
+            )
+            if (before_previous is not None and j > 1
+                    and query_char == text[j - 2] and query[i - 2] == text_char):
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if min(current) > limit:
+            return None
+        before_previous, previous = previous, current
+    distance = min(previous)
+    return distance if distance <= limit else None
+
+
+class FuzzyTitleIndex:
+    """Trigram inverted index over normalized titles."""
+
+    def __init__(self):
+        self._doc_movie_ids = array("I")    # document number -> movie id
+        self._doc_gram_counts = array("H")  # document number -> number of trigrams
+        self._doc_keys: List[str] = []      # document number -> normalized title
+        self._postings: Dict[str, array] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_keys)
+
+    def reload(self, db: Session):
+        """Rebuild the index from the movies table."""
+        rows = db.query(Movie.id, Movie.title, Movie.original_title).all()
+        fresh = FuzzyTitleIndex()
+        for movie_id, title, original_title in rows:
+            fresh._add_documents(movie_id, title, original_title)
+
+        with self._lock:
+            self._doc_movie_ids = fresh._doc_movie_ids
+            self._doc_gram_counts = fresh._doc_gram_counts
+            self._doc_keys = fresh._doc_keys
+            self._postings = fresh._postings
+
+    def add(self, movie_id: int, title: str, original_title: Optional[str] = None):
+        """Register a freshly inserted movie."""
+        with self._lock:
+            self._add_documents(movie_id, title, original_title)
+
+    def search(self, q: str, limit: int, offset: int = 0) -> List[int]:
+        """Movie ids whose title is within a few typos of `q`, best first."""
+        query = normalize_title(q)
+        if not query:
+            return []
+        query_grams = set(trigrams(query))
+        max_edits = allowed_edits(query)
+
+        with self._lock:
+            candidates = self._candidates(query_grams)
+            matches: Dict[int, Tuple[int, float]] = {}
+            for dice, doc in candidates:
+                distance = substring_edit_distance(query, self._doc_keys[doc], max_edits)
+                if distance is None:
+                    continue
+                movie_id = self._doc_movie_ids[doc]
+                score = (distance, -dice)
+                if movie_id not in matches or score < matches[movie_id]:
+                    matches[movie_id] = score
+
+        ranked = sorted(matches.items(), key=lambda item: (item[1], item[0]))
+        return [movie_id for movie_id, _ in ranked[offset:offset + limit]]
+
+    def _candidates(self, query_grams: set) -> List[Tuple[float, int]]:
+        postings = [self._postings[gram] for gram in query_grams if gram in self._postings]
+        stop_size = STOP_GRAM_RATIO * len(self._doc_keys)
+        selective = [docs for docs in postings if len(docs) <= stop_size]
+        if len(selective) >= 3:
+            postings = selective
+
+        overlap: Dict[int, int] = {}
+        for docs in postings:
+            for doc in docs:
+                overlap[doc] = overlap.get(doc, 0) + 1
+
+        scored = (
+            (2.0 * shared / (len(query_grams) + self._doc_gram_counts[doc]), doc)
+            for doc, shared in overlap.items()
+        )
+        return heapq.nlargest(
+            MAX_CANDIDATES,
+            (candidate for candidate in scored if candidate[0] >= MIN_DICE)
+        )
+
+    def _add_documents(self, movie_id: int, title: Optional[str], original_title: Optional[str]):
+        keys = {normalize_title(text) for text in (title, original_title)} - {""}
+        for key in keys:
+            doc = len(self._doc_keys)
+            grams = set(trigrams(key))
+            self._doc_keys.append(key)
+            self._doc_movie_ids.append(movie_id)
+            self._doc_gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                self._postings.setdefault(gram, array("I")).append(doc)
+
+
+# One index per worker process
+fuzzy_title_index = FuzzyTitleIndex()
@@ -0,0 +1,155 @@
+"""
+Per-worker genre lookup for write paths.
+
+The genres table is tiny and almost never changes, yet creating a movie used
+to query it once per genre name (POST /pelicula/) or TMDb genre id
+(populate_db.py). The registry loads every genre once per process and maps
+names and TMDb ids to genre ids, so attaching genres costs no queries: the
+movie_genres rows are inserted directly.
+
+A name the registry doesn't know is looked up or created in its own short
+transaction, so a genre id is only cached once the genre row is committed.
+Names are matched case-insensitively (genre_key()).
+"""
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import Genre
+from models.movie import movie_genres
+from services.offload import run_blocking
+
+
+def genre_key(name: str) -> str:
+    """
+    Registry key of a genre name.
+
+    Names are matched case-insensitively and without surrounding spaces: MySQL's
+    default collation compares them that way, so "drama" finds the stored
+    "Drama" there, and the other databases are given the same behaviour.
+    """
+    return name.strip().casefold()
+
+
+def distinct_genre_names(names: Iterable[str]) -> List[str]:
+    """The first spelling of each genre in `names`."""
+    first: Dict[str, str] = {}
+    for name in names:
+        first.setdefault(genre_key(name), name)
+    return list(first.values())
+
+
+class StoredGenre(NamedTuple):
+    id: int
+    name: str  # as stored, which may differ from the requested spelling
+
+
+class GenreRegistry:
+    """Genre ids by name (see genre_key()) and by TMDb id."""
+
+    def __init__(self):
+        self._by_name: Dict[str, StoredGenre] = {}
+        self._by_tmdb_id: Dict[int, int] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def reload(self, db: Session):
+        """Replace the registry with the genres currently in the database."""
+        rows = db.query(Genre.id, Genre.name, Genre.tmdb_id).order_by(Genre.id).all()
+        run_blocking(self._rebuild, rows)
+
+    def _rebuild(self, rows):
+        by_name: Dict[str, StoredGenre] = {}
+        for genre_id, name, _ in rows:
+            # The oldest genre wins when names only differ in case
+            by_name.setdefault(genre_key(name), StoredGenre(genre_id, name))
+        with self._lock:
+            self._by_name = by_name
+            self._by_tmdb_id = {tmdb_id: genre_id for genre_id, _, tmdb_id in rows if tmdb_id is not None}
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self._loaded:
+            self.reload(db)
+
+    def register(self, genre_id: int, name: str, tmdb_id: Optional[int] = None):
+        """Record a committed genre."""
+        with self._lock:
+            self._by_name.setdefault(genre_key(name), StoredGenre(genre_id, name))
+            if tmdb_id is not None:
+                self._by_tmdb_id[tmdb_id] = genre_id
+
+    def id_for_tmdb_id(self, db: Session, tmdb_id: int) -> Optional[int]:
+        """Genre id of a TMDb genre id, or None if there is no such genre."""
+        self.ensure_loaded(db)
+        return self._by_tmdb_id.get(tmdb_id)
+
+    def ids_for_names(self, db: Session, names: Iterable[str]) -> Dict[str, StoredGenre]:
+        """
+        Stored genre (id and name) for each requested name, creating the genres that don't exist yet.
+
+        Names that differ only in case or surrounding spaces are the same genre;
+        the result is keyed by the first spelling requested, while responses and
+        the catalog indexes should use the stored name. Known names cost no
+        query. Unknown ones are looked up, and the ones still missing created
+        (or found, if another worker created them), committed right away.
+        """
+        self.ensure_loaded(db)
+        requested = {genre_key(name): name for name in distinct_genre_names(names)}
+        missing = {key: name for key, name in requested.items() if key not in self._by_name}
+        if missing:
+            self._create(db, missing)
+        return {name: self._by_name[key] for key, name in requested.items()}
+
+    def _create(self, db: Session, missing: Dict[str, str]):
+        """Find or create the genres of `missing` (key -> requested name) and register them."""
+        table = Genre.__table__
+        # Own transaction: the caller's may still roll back, but the ids are cached now
+        with Session(bind=db.get_bind()) as genre_db:
+            found = self._find(genre_db, missing)
+            rows = [{"name": name.strip()} for key, name in missing.items() if key not in found]
+            if rows:
+                dialect = genre_db.get_bind().dialect.name
+                if dialect == "postgresql":
+                    genre_db.execute(postgresql.insert(table).on_conflict_do_nothing(index_elements=["name"]), rows)
+                elif dialect == "sqlite":
+                    genre_db.execute(sqlite.insert(table).on_conflict_do_nothing(index_elements=["name"]), rows)
+                elif dialect == "mysql":
+                    genre_db.execute(mysql.insert(table).prefix_with("IGNORE"), rows)
+                else:
+                    genre_db.execute(table.insert(), rows)
+                found = self._find(genre_db, missing)
+            genre_db.commit()
+        for genre_id, name, tmdb_id in found.values():
+            self.register(genre_id, name, tmdb_id)
+
+    @staticmethod
+    def _find(db: Session, missing: Dict[str, str]) -> Dict[str, tuple]:
+        """Stored genres matching the keys of `missing`, oldest first per key."""
+        lowered = {name.strip().lower() for name in missing.values()}
+        rows = db.query(Genre.id, Genre.name, Genre.tmdb_id).filter(
+            func.lower(func.trim(Genre.name)).in_(lowered)
+        ).order_by(Genre.id).all()
+        found: Dict[str, tuple] = {}
+        for row in rows:
+            key = genre_key(row.name)
+            if key in missing:
+                found.setdefault(key, tuple(row))
+        return found
+
+
+def link_genres(db: Session, movie_id: int, genre_ids: Iterable[int]):
+    """Attach genres to a flushed movie with one multi-row movie_genres INSERT (does not commit)."""
+    rows = [{"movie_id": movie_id, "genre_id": genre_id} for genre_id in dict.fromkeys(genre_ids)]
+    if rows:
+        db.execute(insert(movie_genres), rows)
+
+
+# One registry per worker process
+genre_registry = GenreRegistry()
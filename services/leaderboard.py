@@ -0,0 +1,188 @@
+"""
+In-process leaderboard for GET /opiniones/top.
+
+The ranking only changes when a vote lands or an opinion is added, so each
+worker keeps the best LEADERBOARD_SIZE opinions in memory, sorted on the same
+key as the SQL query (absurdity_score desc, vote balance desc, id desc). Votes
+and new opinions cast through this worker update it in place; a resync every
+LEADERBOARD_TTL_SECONDS picks up writes made by other workers, so all workers
+converge on the database ranking.
+
+The window only knows the opinions ranked above its last entry (the floor).
+An opinion that drops below the floor is evicted, and pages past the end of
+the window are served from SQL.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import GeneratedOpinion, Movie
+from services.offload import run_blocking
+
+# Opinions kept in memory per worker
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "1000"))
+
+# How long a worker trusts its leaderboard before resyncing it from the database
+LEADERBOARD_TTL_SECONDS = float(os.getenv("LEADERBOARD_TTL_SECONDS", "30"))
+
+
+class RankedOpinion(NamedTuple):
+    id: int
+    movie_id: int
+    movie_title: str
+    content: str
+    absurdity_score: float
+    generation_method: Optional[str]
+    vote_count: int = 0
+    up_votes: int = 0
+    down_votes: int = 0
+    lol_votes: int = 0
+    wtf_votes: int = 0
+
+    @property
+    def vote_balance(self) -> int:
+        return self.up_votes - self.down_votes
+
+    @property
+    def rank_key(self) -> Tuple[float, int, int]:
+        """Ascending sort key matching ORDER BY absurdity_score, vote_balance, id DESC."""
+        return -self.absurdity_score, -self.vote_balance, -self.id
+
+
+def key_from_cursor(absurdity_score: float, vote_balance: int, opinion_id: int) -> Tuple[float, int, int]:
+    """Rank key of the (absurdity_score, vote_balance, id) values stored in a page cursor."""
+    return -absurdity_score, -vote_balance, -opinion_id
+
+
+class Leaderboard:
+    """Sorted window over the top-ranked generated opinions."""
+
+    def __init__(self, size: int = LEADERBOARD_SIZE, ttl_seconds: float = LEADERBOARD_TTL_SECONDS):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self._keys: List[Tuple[float, int, int]] = []  # sorted rank keys
+        self._entries: Dict[int, RankedOpinion] = {}   # opinion id -> entry
+        self._complete = False  # True when the window holds every opinion
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def ensure_loaded(self, db: Session):
+        """Load the leaderboard on first use, when stale, and once it is older than the TTL."""
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl_seconds:
+            self.reload(db)
+
+    def reload(self, db: Session):
+        """Replace the window with the current top opinions."""
+        rows = db.query(
+            GeneratedOpinion.id,
+            GeneratedOpinion.movie_id,
+            Movie.title,
+            GeneratedOpinion.content,
+            GeneratedOpinion.absurdity_score,
+            GeneratedOpinion.generation_method,
+            GeneratedOpinion.vote_count,
+            GeneratedOpinion.up_votes,
+            GeneratedOpinion.down_votes,
+            GeneratedOpinion.lol_votes,
+            GeneratedOpinion.wtf_votes,
+        ).join(
+            Movie, GeneratedOpinion.movie_id == Movie.id
+        ).order_by(
+            GeneratedOpinion.absurdity_score.desc(),
+            GeneratedOpinion.vote_balance.desc(),
+            GeneratedOpinion.id.desc()
+        ).limit(self.size + 1).all()
+        run_blocking(self._rebuild, rows)
+
+    def _rebuild(self, rows):
+        entries = [RankedOpinion(*row) for row in rows[:self.size]]
+        with self._lock:
+            self._entries = {entry.id: entry for entry in entries}
+            self._keys = sorted(entry.rank_key for entry in entries)
+            self._complete = len(rows) <= self.size
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a resync on the next read."""
+        self._loaded_at = None
+
+    def add(self, entry: RankedOpinion):
+        """Register a freshly inserted opinion."""
+        with self._lock:
+            if self._loaded_at is None or entry.id in self._entries:
+                return
+            if not self._complete and not self._above_floor(entry.rank_key):
+                return
+            self._insert(entry)
+            if len(self._keys) > self.size:
+                evicted = self._keys.pop()
+                del self._entries[-evicted[2]]
+                self._complete = False
+
+    def record_vote(self, opinion_id: int, absurdity_score: float, deltas: Dict[str, int]):
+        """
+        Apply the counter changes of a committed vote (see services.votes.counter_deltas).
+
+        `absurdity_score` tells whether an opinion outside the window could have
+        moved into it; if so the window is resynced instead of guessed.
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            entry = self._entries.get(opinion_id)
+            if entry is None:
+                # Unknown opinion: either created elsewhere (window complete) or
+                # ranked below the floor, where only a tie on absurdity can move it up
+                if self._complete or not self._keys or -self._keys[-1][0] <= absurdity_score:
+                    self.invalidate()
+                return
+
+            self._remove(entry)
+            entry = entry._replace(**{
+                name: getattr(entry, name) + delta for name, delta in deltas.items() if name in entry._fields
+            })
+            if self._complete or self._above_floor(entry.rank_key):
+                self._insert(entry)
+            elif len(self._keys) < self.size // 2:
+                # Too many opinions fell below the floor; rebuild the window
+                self.invalidate()
+
+    def page(self, limit: int, after: Optional[Sequence] = None) -> Optional[Tuple[List[RankedOpinion], bool]]:
+        """
+        Up to `limit` opinions ranked after the cursor values `after` (absurdity, balance, id).
+
+        Returns:
+            (opinions, has_more), or None when the page reaches past the window
+            and has to be read from the database
+        """
+        with self._lock:
+            start = bisect.bisect_right(self._keys, key_from_cursor(*after)) if after is not None else 0
+            end = start + limit
+            if end > len(self._keys) and not self._complete:
+                return None
+            opinions = [self._entries[-key[2]] for key in self._keys[start:end]]
+            return opinions, end < len(self._keys) or not self._complete
+
+    def _above_floor(self, key) -> bool:
+        return bool(self._keys) and key < self._keys[-1]
+
+    def _insert(self, entry: RankedOpinion):
+        bisect.insort(self._keys, entry.rank_key)
+        self._entries[entry.id] = entry
+
+    def _remove(self, entry: RankedOpinion):
+        offset = bisect.bisect_left(self._keys, entry.rank_key)
+        del self._keys[offset]
+        del self._entries[entry.id]
+
+
+# One leaderboard per worker process
+leaderboard = Leaderboard()
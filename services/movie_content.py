@@ -0,0 +1,70 @@
+"""
+Random review / opinion picks done inside the database.
+
+Endpoints that show "one real review and one fake opinion" used to lazy-load
+every ExternalReview and GeneratedOpinion of a movie just to random.choice()
+a single row. These helpers pick the row in SQL instead: one query counts the
+children per movie, a second one numbers them by id and returns only the
+chosen row's content. Both queries work for any number of movies at once.
+"""
+import random
+from typing import Dict, Iterable
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from models import ExternalReview, GeneratedOpinion
+
+DEFAULT_FAKE_OPINION = "This movie is unreliable... like a unicorn!"
+
+
+def pick_random_contents(db: Session, model, movie_ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Pick one random child row per movie and return its content.
+
+    Args:
+        db: Database session
+        model: Child model with `movie_id` and `content` columns
+        movie_ids: Movies to pick for
+
+    Returns:
+        Mapping of movie id to content, only for movies that have children
+    """
+    movie_ids = list(movie_ids)
+    if not movie_ids:
+        return {}
+
+    counts = db.query(model.movie_id, func.count(model.id)).filter(
+        model.movie_id.in_(movie_ids)
+    ).group_by(model.movie_id).all()
+    if not counts:
+        return {}
+
+    # Choose a 1-based position per movie, then fetch only those rows
+    picks = [(movie_id, random.randint(1, count)) for movie_id, count in counts]
+
+    ranked = db.query(
+        model.id.label("id"),
+        model.movie_id.label("movie_id"),
+        func.row_number().over(partition_by=model.movie_id, order_by=model.id).label("position")
+    ).filter(
+        model.movie_id.in_([movie_id for movie_id, _ in picks])
+    ).subquery()
+
+    rows = db.query(model.movie_id, model.content).join(
+        ranked, model.id == ranked.c.id
+    ).filter(
+        tuple_(ranked.c.movie_id, ranked.c.position).in_(picks)
+    ).all()
+
+    return {movie_id: content for movie_id, content in rows}
+
+
+def random_review_texts(db: Session, movie_ids: Iterable[int]) -> Dict[int, str]:
+    """One random real review per movie."""
+    return pick_random_contents(db, ExternalReview, movie_ids)
+
+
+def random_opinion_texts(db: Session, movie_ids: Iterable[int]) -> Dict[int, str]:
+    """One random generated opinion per movie."""
+    return pick_random_contents(db, GeneratedOpinion, movie_ids)
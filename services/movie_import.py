@@ -0,0 +1,259 @@
+"""
+Bulk movie import for POST /pelicula/import.
+
+POST /pelicula/ stores one movie per request, with its own title check and
+commit. The import endpoint instead reads NDJSON (one
+MovieCreate object per line) as it arrives and hands it over in chunks of
+IMPORT_CHUNK_SIZE movies. Each chunk costs a fixed number of queries:
+
+- one lookup of the chunk's titles against lower(title) / lower(original_title)
+  (indexes ix_movies_title_lower / ix_movies_original_title_lower),
+- no genre queries: ids come from the per-worker genre registry
+  (services/genre_registry.py), which creates unknown genres in bulk,
+- the movie INSERTs (multi-row on PostgreSQL, where the ORM can match the
+  returned ids to the rows; one per movie elsewhere), one multi-row
+  movie_genres INSERT and one commit.
+
+Imported movies are added to the catalog indexes right after their chunk
+commits. Only the current chunk is kept in memory: the per-line report goes
+to a temporary file (in memory up to IMPORT_REPORT_MEMORY_BYTES) and is sent
+once the whole body has been read.
+"""
+import json
+import logging
+import os
+import tempfile
+from typing import AsyncIterator, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Movie
+from models.movie import movie_genres
+from schemas.movie import MovieCreate
+from services.catalog import register_movie
+from services.genre_registry import distinct_genre_names, genre_key, genre_registry
+
+logger = logging.getLogger(__name__)
+
+# Movies stored per transaction
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+
+# Longest NDJSON line accepted, in bytes
+MAX_IMPORT_LINE_BYTES = 64 * 1024
+
+# Report kept in memory up to this size, then moved to a temporary file on disk
+IMPORT_REPORT_MEMORY_BYTES = 1024 * 1024
+
+# Outcome of each imported line
+IMPORT_CREATED = "created"
+IMPORT_DUPLICATE = "duplicate"
+IMPORT_ERROR = "error"
+
+
+class ImportedLine(NamedTuple):
+    line: int
+    status: str  # IMPORT_CREATED or IMPORT_DUPLICATE
+    title: str
+    movie_id: Optional[int] = None
+
+
+class MovieImport:
+    """
+    One run of POST /pelicula/import: parses lines into chunks and keeps the report.
+
+    The report is NDJSON: one record per line (created / duplicate / error),
+    a progress record after each chunk and a final summary. Records are
+    written to a temporary file as they are produced, so memory does not grow
+    with the number of lines; report() reads it back and removes it.
+    """
+
+    def __init__(self, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.lines = 0
+        self.counts = dict.fromkeys((IMPORT_CREATED, IMPORT_DUPLICATE, IMPORT_ERROR), 0)
+        self._pending: List[Tuple[int, MovieCreate]] = []
+        self._records = tempfile.SpooledTemporaryFile(max_size=IMPORT_REPORT_MEMORY_BYTES, mode="w+", encoding="utf-8")
+
+    def add_line(self, number: int, line: Optional[bytes]) -> bool:
+        """Parse one line; returns True once a full chunk is waiting for store_pending()."""
+        self.lines = number
+        try:
+            self._pending.append((number, parse_movie_line(line)))
+        except ValueError as error:
+            self._record({"line": number, "status": IMPORT_ERROR, "detail": str(error)})
+        return len(self._pending) >= self.chunk_size
+
+    def store_pending(self):
+        """Store the waiting chunk (blocking; run it in a worker thread)."""
+        chunk, self._pending = self._pending, []
+        if not chunk:
+            return
+        try:
+            results = import_movie_chunk(chunk)
+        except SQLAlchemyError:
+            logger.exception("Could not import movies of lines %d-%d", chunk[0][0], chunk[-1][0])
+            for number, _ in chunk:
+                self._record({"line": number, "status": IMPORT_ERROR, "detail": "Could not store this movie"})
+        else:
+            for result in results:
+                record = {"line": result.line, "status": result.status, "title": result.title}
+                if result.movie_id is not None:
+                    record["id"] = result.movie_id
+                self._record(record)
+        self._write({"status": "progress", "lines": self.lines, **self.counts})
+        logger.info("Movie import progress: %d lines, %s", self.lines, self.counts)
+
+    def report(self) -> Iterator[str]:
+        """The NDJSON report, ending with the summary (can be read once)."""
+        try:
+            self._records.seek(0)
+            yield from self._records
+            yield json.dumps({"status": "done", "lines": self.lines, **self.counts}) + "\n"
+        finally:
+            self._records.close()
+
+    def close(self):
+        """Discard the report (the import was abandoned)."""
+        self._records.close()
+
+    def _record(self, record: dict):
+        self.counts[record["status"]] += 1
+        self._write(record)
+
+    def _write(self, record: dict):
+        self._records.write(json.dumps(record) + "\n")
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    (line number, line) for each non-blank line of a byte stream, as it arrives.
+
+    Lines longer than MAX_IMPORT_LINE_BYTES are dropped while reading and
+    yielded as None.
+    """
+    number = 0
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        pieces = (buffer + chunk).split(b"\n")
+        buffer = pieces.pop()
+        for piece in pieces:
+            number += 1
+            if oversized:
+                oversized = False
+                yield number, None
+            elif piece.strip():
+                yield number, piece if len(piece) <= MAX_IMPORT_LINE_BYTES else None
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            oversized = True
+            buffer = b""
+    if oversized or buffer.strip():
+        yield number + 1, None if oversized or len(buffer) > MAX_IMPORT_LINE_BYTES else buffer
+
+
+def parse_movie_line(line: Optional[bytes]) -> MovieCreate:
+    """
+    Parse one NDJSON line.
+
+    Raises:
+        ValueError: with a short description of what is wrong with the line
+    """
+    if line is None:
+        raise ValueError(f"Line longer than {MAX_IMPORT_LINE_BYTES} bytes")
+    try:
+        data = json.loads(line)
+    except ValueError as error:
+        raise ValueError(f"Invalid JSON: {error}")
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    try:
+        return MovieCreate(**data)
+    except ValidationError as error:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+        ))
+
+
+def normalize_title(title: str) -> str:
+    """Key for duplicate checks; must match the lower(...) index expressions."""
+    return title.strip().lower()
+
+
+def import_movie_chunk(movies: List[Tuple[int, MovieCreate]]) -> List[ImportedLine]:
+    """
+    Store a chunk of (line number, movie) pairs in one transaction.
+
+    Movies whose title matches the title or original title of a movie already
+    in the catalog, or of an earlier line, are skipped as duplicates.
+    """
+    db = SessionLocal()
+    try:
+        taken = _existing_titles(db, {normalize_title(movie.title) for _, movie in movies})
+
+        results: List[Optional[ImportedLine]] = []
+        new_movies: List[Tuple[int, Movie, List[str]]] = []
+        for line, movie_data in movies:
+            key = normalize_title(movie_data.title)
+            if key in taken:
+                results.append(ImportedLine(line, IMPORT_DUPLICATE, movie_data.title))
+                continue
+            taken.add(key)
+            if movie_data.original_title:
+                taken.add(normalize_title(movie_data.original_title))
+            movie = Movie(
+                title=movie_data.title.strip(),
+                original_title=movie_data.original_title,
+                overview=movie_data.overview,
+                release_date=movie_data.release_date,
+                runtime=movie_data.runtime,
+                poster_url=movie_data.poster_url,
+                backdrop_url=movie_data.backdrop_url
+            )
+            new_movies.append((len(results), movie, distinct_genre_names(movie_data.genre_names)))
+            results.append(None)
+
+        if new_movies:
+            requested = genre_registry.ids_for_names(db, [name for _, _, names in new_movies for name in names])
+            stored = {genre_key(name): genre for name, genre in requested.items()}
+            db.add_all([movie for _, movie, _ in new_movies])
+            db.flush()
+            links = [
+                {"movie_id": movie.id, "genre_id": stored[genre_key(name)].id}
+                for _, movie, names in new_movies
+                for name in names
+            ]
+            if links:
+                db.execute(insert(movie_genres), links)
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for position, movie, names in new_movies:
+        register_movie(movie, [stored[genre_key(name)].name for name in names])
+        line = movies[position][0]
+        results[position] = ImportedLine(line, IMPORT_CREATED, movie.title, movie.id)
+    return results
+
+
+def _existing_titles(db: Session, keys: Iterable[str]) -> set:
+    """Which normalized titles are already used as a title or original title."""
+    keys = sorted(keys)
+    if not keys:
+        return set()
+    rows = db.query(Movie.title, Movie.original_title).filter(or_(
+        func.lower(Movie.title).in_(keys),
+        func.lower(Movie.original_title).in_(keys)
+    ))
+    taken = set()
+    for title, original_title in rows:
+        taken.add(normalize_title(title))
+        if original_title:
+            taken.add(normalize_title(original_title))
+    return taken
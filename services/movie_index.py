@@ -0,0 +1,308 @@
+"""
+In-process index of live movie ids.
+
+GET /pelicula/random used to run ORDER BY random() over the whole movies table.
+Each worker now keeps a dense list of movie ids and picks one with
+random.choice, so a draw is O(1) and stays uniform on PostgreSQL and MySQL alike.
+
+The index also keeps per-genre and per-year id sets plus the ids sorted by
+vote_average, so a filtered pick only walks the smallest matching set instead
+of asking the database for a filtered, sorted scan. Popularity-weighted picks
+are O(1) draws from an alias table (services/alias_table.py).
+"""
+import bisect
+import heapq
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from models import Movie, Genre, movie_genres
+from schemas.movie import RandomWeighting
+from services.alias_table import WeightedSampler
+from services.offload import run_blocking
+
+# How long a worker trusts its id list before the background refresh in main.py
+# reloads it (services/catalog.py). Movies created through this worker are
+# added right away; the reload picks up movies created by other workers or by
+# populate_db.py.
+MOVIE_INDEX_TTL_SECONDS = float(os.getenv("MOVIE_INDEX_TTL_SECONDS", "300"))
+
+
+class MovieIndex:
+    """Dense list of movie ids supporting O(1) uniform and filtered sampling."""
+
+    def __init__(self):
+        self._ids = []         # dense, so random.choice is uniform
+        self._positions = {}   # movie id -> position in _ids
+        self._years = {}       # movie id -> release year
+        self._ratings = {}     # movie id -> vote_average
+        self._genres = {}      # movie id -> set of lower-cased genre names
+        self._by_year: Dict[int, Set[int]] = {}
+        self._by_genre: Dict[str, Set[int]] = {}
+        self._rated_scores = []  # sorted vote_average values...
+        self._rated_ids = []     # ...and the matching movie ids
+        self._popularity = WeightedSampler()  # movie id -> popularity weight
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def ensure_loaded(self, db: Session):
+        """Load the index on first use; the background catalog refresh keeps it current."""
+        if self._loaded_at is None:
+            self.reload(db)
+
+    def reload(self, db: Session):
+        """Replace the index with the movies currently in the database."""
+        rows = db.query(Movie.id, Movie.release_year, Movie.vote_average, Movie.popularity).all()
+        genre_rows = db.query(movie_genres.c.movie_id, Genre.name).join(
+            Genre, Genre.id == movie_genres.c.genre_id
+        ).all()
+
+        run_blocking(self._rebuild, rows, genre_rows)
+
+    def _rebuild(self, rows, genre_rows):
+        genres_by_movie: Dict[int, List[str]] = {}
+        for movie_id, genre_name in genre_rows:
+            genres_by_movie.setdefault(movie_id, []).append(genre_name)
+
+        with self._lock:
+            self._clear()
+            for movie_id, release_year, vote_average, _ in rows:
+                self._insert(movie_id, release_year, vote_average, genres_by_movie.get(movie_id, ()), bulk=True)
+            # Build the rating order and the alias table once instead of row by row
+            rated = sorted((score, movie_id) for movie_id, score in self._ratings.items())
+            self._rated_scores = [score for score, _ in rated]
+            self._rated_ids = [movie_id for _, movie_id in rated]
+            self._popularity.rebuild({movie_id: popularity or 0.0 for movie_id, _, _, popularity in rows})
+            self._loaded_at = time.monotonic()
+
+    def add(
+        self,
+        movie_id: int,
+        release_year: Optional[int] = None,
+        vote_average: Optional[float] = None,
+        genre_names: Iterable[str] = (),
+        popularity: Optional[float] = None
+    ):
+        """Register a freshly inserted movie."""
+        with self._lock:
+            if movie_id not in self._positions:
+                self._insert(movie_id, release_year, vote_average, genre_names)
+                self._popularity.set_weight(movie_id, popularity or 0.0)
+
+    def discard(self, movie_id: int):
+        """Forget a movie id (e.g. it was deleted since the last reload)."""
+        with self._lock:
+            position = self._positions.pop(movie_id, None)
+            if position is None:
+                return
+            # Swap with the last id to keep the list dense
+            last_id = self._ids.pop()
+            if last_id != movie_id:
+                self._ids[position] = last_id
+                self._positions[last_id] = position
+
+            release_year = self._years.pop(movie_id, None)
+            if release_year is not None:
+                self._by_year[release_year].discard(movie_id)
+            for genre_name in self._genres.pop(movie_id, ()):
+                self._by_genre[genre_name].discard(movie_id)
+            vote_average = self._ratings.pop(movie_id, None)
+            if vote_average is not None:
+                start = bisect.bisect_left(self._rated_scores, vote_average)
+                offset = self._rated_ids.index(movie_id, start)
+                del self._rated_scores[offset]
+                del self._rated_ids[offset]
+            self._popularity.remove(movie_id)
+
+    def sample(
+        self,
+        db: Session,
+        genre: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        weighted: Optional[RandomWeighting] = None
+    ) -> Optional[int]:
+        """
+        Return a random movie id matching the filters, or None.
+
+        Uniform by default; with weighted=popularity each movie is picked in
+        proportion to its popularity (movies without popularity are never picked).
+        """
+        self.ensure_loaded(db)
+        walks_candidates = (
+            _has_filters(genre, year_from, year_to, min_rating)
+            and not _rating_only(genre, year_from, year_to, min_rating, weighted)
+        )
+        if walks_candidates:
+            # Off the event loop in async mode
+            return run_blocking(self._sample, genre, year_from, year_to, min_rating, weighted)
+        return self._sample(genre, year_from, year_to, min_rating, weighted)
+
+    def _sample(self, genre, year_from, year_to, min_rating, weighted) -> Optional[int]:
+        with self._lock:
+            filtered = _has_filters(genre, year_from, year_to, min_rating)
+            if weighted == RandomWeighting.POPULARITY and not filtered:
+                return self._popularity.draw()
+            if _rating_only(genre, year_from, year_to, min_rating, weighted):
+                picked = self._rated_sample(min_rating, 1)
+                return picked[0] if picked else None
+
+            candidates = self._candidates(genre, year_from, year_to, min_rating)
+            if weighted == RandomWeighting.POPULARITY:
+                picked = self._weighted_sample(candidates, 1)
+                return picked[0] if picked else None
+            if not candidates:
+                return None
+            return random.choice(candidates)
+
+    def sample_many(
+        self,
+        db: Session,
+        count: int,
+        genre: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        weighted: Optional[RandomWeighting] = None
+    ) -> List[int]:
+        """Return up to `count` distinct movie ids matching the filters, picked like sample()."""
+        self.ensure_loaded(db)
+        return run_blocking(self._sample_many, count, genre, year_from, year_to, min_rating, weighted)
+
+    def _sample_many(self, count, genre, year_from, year_to, min_rating, weighted) -> List[int]:
+        with self._lock:
+            filtered = _has_filters(genre, year_from, year_to, min_rating)
+            if weighted == RandomWeighting.POPULARITY and not filtered:
+                return self._draw_distinct(count)
+            if _rating_only(genre, year_from, year_to, min_rating, weighted):
+                return self._rated_sample(min_rating, count)
+
+            candidates = self._candidates(genre, year_from, year_to, min_rating)
+            if weighted == RandomWeighting.POPULARITY:
+                return self._weighted_sample(candidates, count)
+            return random.sample(candidates, min(count, len(candidates)))
+
+    def _clear(self):
+        self._ids = []
+        self._positions = {}
+        self._years = {}
+        self._ratings = {}
+        self._genres = {}
+        self._by_year = {}
+        self._by_genre = {}
+        self._rated_scores = []
+        self._rated_ids = []
+
+    def _insert(self, movie_id, release_year, vote_average, genre_names, bulk=False):
+        self._positions[movie_id] = len(self._ids)
+        self._ids.append(movie_id)
+
+        if release_year is not None:
+            self._years[movie_id] = release_year
+            self._by_year.setdefault(release_year, set()).add(movie_id)
+
+        names = {name.lower() for name in genre_names}
+        if names:
+            self._genres[movie_id] = names
+            for name in names:
+                self._by_genre.setdefault(name, set()).add(movie_id)
+
+        if vote_average is not None:
+            self._ratings[movie_id] = vote_average
+            if not bulk:
+                offset = bisect.bisect_right(self._rated_scores, vote_average)
+                self._rated_scores.insert(offset, vote_average)
+                self._rated_ids.insert(offset, movie_id)
+
+    def _candidates(self, genre, year_from, year_to, min_rating) -> List[int]:
+        """
+        Ids matching every filter.
+
+        Walks only the smallest of the matching sets (genre, year range or
+        rating suffix) and checks the other filters per id.
+        """
+        if not _has_filters(genre, year_from, year_to, min_rating):
+            return self._ids
+
+        sources = []
+        checks = []
+
+        if genre is not None:
+            genre_ids = self._by_genre.get(genre.lower(), set())
+            sources.append((len(genre_ids), lambda: genre_ids))
+            checks.append(genre_ids.__contains__)
+
+        if year_from is not None or year_to is not None:
+            low = year_from if year_from is not None else float("-inf")
+            high = year_to if year_to is not None else float("inf")
+            year_sets = [ids for year, ids in self._by_year.items() if low <= year <= high]
+            sources.append((
+                sum(len(ids) for ids in year_sets),
+                lambda: (movie_id for ids in year_sets for movie_id in ids)
+            ))
+            checks.append(lambda movie_id: movie_id in self._years and low <= self._years[movie_id] <= high)
+
+        if min_rating is not None:
+            start = bisect.bisect_left(self._rated_scores, min_rating)
+            rated_ids = self._rated_ids
+            sources.append((
+                len(rated_ids) - start,
+                lambda: (rated_ids[offset] for offset in range(start, len(rated_ids)))
+            ))
+            checks.append(lambda movie_id: movie_id in self._ratings and self._ratings[movie_id] >= min_rating)
+
+        _, smallest = min(sources, key=lambda source: source[0])
+        return [movie_id for movie_id in smallest() if all(check(movie_id) for check in checks)]
+
+    def _rated_sample(self, min_rating: float, count: int) -> List[int]:
+        """Distinct uniform picks rated at least `min_rating`, by position in the rating order."""
+        start = bisect.bisect_left(self._rated_scores, min_rating)
+        offsets = range(start, len(self._rated_ids))
+        return [self._rated_ids[offset] for offset in random.sample(offsets, min(count, len(offsets)))]
+
+    def _draw_distinct(self, count: int) -> List[int]:
+        """Distinct popularity-weighted draws from the alias table."""
+        count = min(count, len(self._popularity))
+        picked = {}
+        # Popular movies repeat, so allow a generous but bounded number of draws
+        for _ in range(count * 20):
+            if len(picked) == count:
+                break
+            movie_id = self._popularity.draw()
+            if movie_id is None:
+                break
+            picked[movie_id] = None
+        return list(picked)
+
+    def _weighted_sample(self, candidates: List[int], count: int) -> List[int]:
+        """Popularity-weighted sample without replacement (Efraimidis-Spirakis keys)."""
+        keyed = []
+        for movie_id in candidates:
+            weight = self._popularity.weight(movie_id)
+            if weight > 0:
+                keyed.append((random.random() ** (1.0 / weight), movie_id))
+        return [movie_id for _, movie_id in heapq.nlargest(count, keyed)]
+
+
+def _has_filters(genre, year_from, year_to, min_rating) -> bool:
+    return not (genre is None and year_from is None and year_to is None and min_rating is None)
+
+
+def _rating_only(genre, year_from, year_to, min_rating, weighted) -> bool:
+    """A uniform pick filtered by min_rating alone, served without a candidate list."""
+    return (
+        min_rating is not None and genre is None and year_from is None and year_to is None
+        and weighted != RandomWeighting.POPULARITY
+    )
+
+
+# One index per worker process
+movie_index = MovieIndex()
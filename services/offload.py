@@ -0,0 +1,28 @@
+"""
+CPU-bound work off the event loop in async mode (DB_ASYNC=true).
+
+In async mode the sync route handlers run inside AsyncSession.run_sync()
+(routers/async_routes.py), that is on the event loop thread: only the
+queries are awaited, and pure Python work in a handler (a filtered random
+pick, fuzzy trigram scoring, rebuilding a per-worker index from the rows it
+just fetched) stalls every other request of the worker while it runs.
+
+run_blocking() hands such work to Starlette's threadpool and waits for it
+through SQLAlchemy's greenlet bridge, the same way the session waits for its
+queries, so the loop keeps serving other requests. Anywhere else (sync mode,
+where handlers already run in the threadpool, or background threads) it
+simply calls the function.
+"""
+from typing import Callable, TypeVar
+
+from sqlalchemy.util.concurrency import await_, in_greenlet
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+
+def run_blocking(function: Callable[..., T], *args, **kwargs) -> T:
+    """Call `function`, in the threadpool when running on the event loop under run_sync()."""
+    if in_greenlet():
+        return await_(run_in_threadpool(function, *args, **kwargs))
+    return function(*args, **kwargs)
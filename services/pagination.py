@@ -0,0 +1,49 @@
+"""
+Opaque cursors for keyset pagination.
+
+A cursor is the sort key of the last row of a page (e.g. [relevance, id]),
+JSON-encoded and base64url'd. The next page is fetched with a WHERE clause
+on that key instead of an OFFSET, so every page costs the same. List
+endpoints return the cursor of the next page in the X-Next-Cursor header,
+which keeps their JSON bodies unchanged.
+"""
+import base64
+import binascii
+import json
+from numbers import Real
+from typing import List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode a page's last sort key as an opaque string."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List:
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or does not hold `size` numbers
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if (not isinstance(values, list) or len(values) != size
+            or not all(isinstance(value, Real) and not isinstance(value, bool) for value in values)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    """Expose the next page's cursor to the client (nothing when this was the last page)."""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
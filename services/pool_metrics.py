@@ -0,0 +1,109 @@
+"""
+Connection pool statistics for GET /internal/pool.
+
+The engines in database.py use InstrumentedQueuePool (InstrumentedAsyncQueuePool
+for the async engine): the default QueuePool, plus a record of how long each
+checkout waited for a connection and how many gave up after DB_POOL_TIMEOUT.
+A checkout served by an idle connection waits a few microseconds; one that
+has to open a connection, or wait for another request to return one, shows
+up in the higher buckets of the histogram.
+
+Statistics are per worker process. Each worker holds up to
+DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so the pools of all workers
+together must stay under the database's max_connections.
+"""
+import bisect
+import threading
+import time
+from typing import List
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds of the checkout wait histogram, in milliseconds (the last bucket is unbounded)
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolStats:
+    """Checkout waits and timeouts of one pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._histogram: List[int] = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._lock = threading.Lock()
+
+    def record(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self._histogram[bisect.bisect_left(WAIT_BUCKETS_MS, wait_seconds * 1000)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound}ms" for bound in WAIT_BUCKETS_MS] + [f"gt_{WAIT_BUCKETS_MS[-1]}ms"]
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "wait_ms_avg": round(self.total_wait_seconds * 1000 / attempts, 3) if attempts else 0.0,
+                "wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+                "wait_ms_histogram": dict(zip(labels, self._histogram)),
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Times every checkout of a QueuePool."""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # Keep the statistics when the engine replaces its pool (e.g. after dispose())
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+
+def pool_status(pool) -> dict:
+    """Current occupancy and checkout statistics of an engine's pool."""
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # Connections opened beyond pool_size; negative while the pool is still filling up
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "timeout_seconds": pool.timeout(),
+    }
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
@@ -0,0 +1,162 @@
+"""
+Per-router database budgets: a statement timeout and a cap on queries per request.
+
+A single slow search or ranking query can hold a pooled connection for
+seconds and starve the other requests of the worker. Each request session
+gets the budget of the router serving it (the route's tag: movies, opinions,
+votes), read from the environment:
+
+- DB_BUDGET_<ROUTER>_TIMEOUT_MS: longest a single statement may run
+  (default DB_BUDGET_TIMEOUT_MS). PostgreSQL enforces it with
+  `SET LOCAL statement_timeout` at the start of each transaction, MySQL with
+  `max_execution_time` (SELECT statements only), SQLite (sync driver only)
+  with a progress handler that interrupts the statement.
+- DB_BUDGET_<ROUTER>_MAX_QUERIES: statements one request may run (default
+  DB_BUDGET_MAX_QUERIES). The next one is refused before it reaches the database.
+
+0 disables either limit. Both failures raise QueryBudgetExceeded, which the
+application answers with 503 and logs with the offending SQL. Sessions
+outside requests (background jobs, scripts) have no budget.
+"""
+import os
+import sqlite3
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Defaults for routers without their own DB_BUDGET_<ROUTER>_* settings
+DB_BUDGET_TIMEOUT_MS = int(os.getenv("DB_BUDGET_TIMEOUT_MS", "5000"))
+DB_BUDGET_MAX_QUERIES = int(os.getenv("DB_BUDGET_MAX_QUERIES", "100"))
+
+# Key of the request's BudgetTracker in Session.info and Connection.info
+BUDGET_KEY = "query_budget"
+
+# Statement cancelled by its timeout: PostgreSQL SQLSTATE and MySQL error number
+PG_QUERY_CANCELED = "57014"
+MYSQL_QUERY_TIMEOUT = 3024
+
+# SQLite virtual machine instructions between two deadline checks
+SQLITE_PROGRESS_STEPS = 10000
+
+
+class QueryBudget(NamedTuple):
+    timeout_ms: int
+    max_queries: int
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran past its router's statement timeout or query cap."""
+
+    def __init__(self, router: str, reason: str, statement: str):
+        super().__init__(f"{router}: {reason}")
+        self.router = router
+        self.reason = reason
+        self.statement = statement
+
+
+class BudgetTracker:
+    """Queries run so far by one request, against its router's budget."""
+
+    def __init__(self, router: str, budget: QueryBudget):
+        self.router = router
+        self.budget = budget
+        self.queries = 0
+        self.deadline = None  # Of the running statement, for SQLite's progress handler
+
+    def timed_out(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+
+def budget_for(router: str) -> QueryBudget:
+    prefix = f"DB_BUDGET_{router.upper()}_"
+    return QueryBudget(
+        timeout_ms=int(os.getenv(prefix + "TIMEOUT_MS", DB_BUDGET_TIMEOUT_MS)),
+        max_queries=int(os.getenv(prefix + "MAX_QUERIES", DB_BUDGET_MAX_QUERIES)),
+    )
+
+
+def attach_budget(session: Session, route) -> None:
+    """Give a request session the budget of the router serving `route` (an APIRoute, or None)."""
+    if route is None or not getattr(route, "tags", None):
+        return
+    router = str(route.tags[0])
+    budget = budget_for(router)
+    if budget.timeout_ms or budget.max_queries:
+        session.info[BUDGET_KEY] = BudgetTracker(router, budget)
+
+
+def install(engine: Engine) -> None:
+    """Enforce request budgets on the connections of `engine`."""
+    event.listen(engine, "before_cursor_execute", _count_query)
+    event.listen(engine, "handle_error", _translate_timeout)
+    event.listen(engine, "checkin", _forget_budget)
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_budget(session: Session, transaction, connection):
+    tracker: Optional[BudgetTracker] = session.info.get(BUDGET_KEY)
+    timeout_ms = tracker.budget.timeout_ms if tracker is not None else 0
+    # The statements below don't count against the request's cap
+    connection.info.pop(BUDGET_KEY, None)
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        if timeout_ms:
+            # Transaction-scoped: back to the server default at COMMIT / ROLLBACK.
+            # One short statement per transaction, as a SET outside it would be
+            # undone by the rollback that ends every read-only request.
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+    elif dialect == "mysql":
+        # Session-scoped, so reset it for sessions with another (or no) budget;
+        # only changes cost a round trip
+        if connection.info.get("max_execution_time", 0) != timeout_ms:
+            connection.exec_driver_sql(f"SET SESSION max_execution_time = {timeout_ms}")
+            connection.info["max_execution_time"] = timeout_ms
+    elif dialect == "sqlite" and timeout_ms:
+        dbapi_connection = connection.connection.dbapi_connection
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            dbapi_connection.set_progress_handler(tracker.timed_out, SQLITE_PROGRESS_STEPS)
+
+    if tracker is not None:
+        connection.info[BUDGET_KEY] = tracker
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    tracker: Optional[BudgetTracker] = conn.info.get(BUDGET_KEY)
+    if tracker is None:
+        return
+    tracker.queries += 1
+    if tracker.budget.max_queries and tracker.queries > tracker.budget.max_queries:
+        raise QueryBudgetExceeded(
+            tracker.router, f"more than {tracker.budget.max_queries} queries in one request", statement
+        )
+    if tracker.budget.timeout_ms:
+        tracker.deadline = time.monotonic() + tracker.budget.timeout_ms / 1000
+
+
+def _translate_timeout(context):
+    connection = context.connection
+    tracker = connection.info.get(BUDGET_KEY) if connection is not None else None
+    if tracker is None or isinstance(context.original_exception, QueryBudgetExceeded):
+        return
+    if _is_statement_timeout(context.original_exception):
+        raise QueryBudgetExceeded(
+            tracker.router, f"statement ran longer than {tracker.budget.timeout_ms} ms", context.statement
+        ) from context.original_exception
+
+
+def _forget_budget(dbapi_connection, connection_record):
+    tracker = connection_record.info.pop(BUDGET_KEY, None)
+    if tracker is not None and isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.set_progress_handler(None, 0)
+
+
+def _is_statement_timeout(error) -> bool:
+    if PG_QUERY_CANCELED in (getattr(error, "pgcode", None), getattr(error, "sqlstate", None)):
+        return True
+    args = getattr(error, "args", ())
+    if args and args[0] == MYSQL_QUERY_TIMEOUT:
+        return True
+    return isinstance(error, sqlite3.OperationalError) and "interrupted" in str(error)
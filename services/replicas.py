@@ -0,0 +1,56 @@
+"""
+Read replica selection for database.get_read_db().
+
+GET endpoints read from the engines in DATABASE_REPLICA_URLS, taken in turn
+so the load is spread evenly. A replica that can't be connected to is skipped
+for REPLICA_RETRY_SECONDS, and when every replica is down reads go to the
+primary. Replication lag is tolerated by these endpoints; a client that needs
+to read its own write sends `X-Consistency: strong` and is served by the
+primary.
+"""
+import itertools
+import threading
+import time
+from typing import Dict, Iterator, List
+
+
+class ReplicaSet:
+    """Round-robin over replica engines, skipping the ones that recently failed."""
+
+    def __init__(self, engines: List, retry_seconds: float):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._turns = itertools.cycle(range(len(engines))) if engines else None
+        self._down_until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.engines)
+
+    def candidates(self) -> Iterator:
+        """Replicas to try for one request: each healthy one once, starting with the next in turn."""
+        if not self.engines:
+            return
+        with self._lock:
+            start = next(self._turns)
+        now = time.monotonic()
+        for offset in range(len(self.engines)):
+            position = (start + offset) % len(self.engines)
+            if self._down_until.get(position, 0.0) <= now:
+                yield self.engines[position]
+
+    def mark_down(self, engine):
+        """Skip a replica for retry_seconds."""
+        position = self.engines.index(engine)
+        with self._lock:
+            self._down_until[position] = time.monotonic() + self.retry_seconds
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": engine.url.render_as_string(hide_password=True),
+                "available": self._down_until.get(position, 0.0) <= now,
+            }
+            for position, engine in enumerate(self.engines)
+        ]
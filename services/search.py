@@ -0,0 +1,130 @@
+"""
+Relevance-ranked title search.
+
+`Movie.title.ilike('%q%')` cannot use a b-tree index, so every search used to
+be a sequential scan. Each database now gets the index type it is good at
+(see alembic/versions/009_add_title_search_indexes.py):
+
+- PostgreSQL: pg_trgm GIN indexes on title / original_title serve the ILIKE
+  match and similarity() ranks it; a GIN tsvector index finds whole words in
+  any order.
+- MySQL: a FULLTEXT index on (title, original_title) with MATCH ... AGAINST.
+- Anything else (e.g. SQLite for local tests): plain ILIKE, ordered by id.
+"""
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, and_, cast, func, literal, literal_column, or_
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session, selectinload
+
+from models import Movie
+from services.fuzzy import fuzzy_title_index
+from services.offload import run_blocking
+
+# InnoDB ignores words shorter than innodb_ft_min_token_size (3 by default)
+MYSQL_MIN_TOKEN_SIZE = 3
+
+# Characters with a special meaning in MySQL boolean full-text queries
+_MYSQL_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+
+def pg_title_document():
+    """tsvector over both titles; must match the expression of ix_movies_title_tsv."""
+    return func.to_tsvector(
+        literal_column("'simple'::regconfig"),
+        func.coalesce(Movie.title, literal_column("''"))
+        + literal_column("' '")
+        + func.coalesce(Movie.original_title, literal_column("''"))
+    )
+
+
+def title_search_terms(db: Session, q: str) -> Tuple[object, object]:
+    """
+    Build the WHERE clause and relevance expression for a title search.
+
+    Returns:
+        (match_clause, relevance) - higher relevance means a better match
+    """
+    dialect = db.get_bind().dialect.name
+    pattern = f"%{q}%"
+    substring_match = or_(Movie.title.ilike(pattern), Movie.original_title.ilike(pattern))
+
+    if dialect == "postgresql":
+        query = func.plainto_tsquery(literal_column("'simple'::regconfig"), q)
+        # similarity() and ts_rank() return real; compare and return as double
+        # so a relevance value round-trips exactly through a page cursor
+        relevance = cast(func.greatest(
+            func.similarity(Movie.title, q),
+            func.similarity(func.coalesce(Movie.original_title, literal_column("''")), q),
+            func.ts_rank(pg_title_document(), query)
+        ), Float(precision=53))
+        return or_(substring_match, pg_title_document().op("@@")(query)), relevance
+
+    if dialect == "mysql":
+        words = [word for word in _MYSQL_BOOLEAN_OPERATORS.sub(" ", q).split() if len(word) >= MYSQL_MIN_TOKEN_SIZE]
+        if words:
+            # Every word must appear, as a whole word or a prefix
+            boolean_query = " ".join(f"+{word}*" for word in words)
+            full_text = match(Movie.title, Movie.original_title, against=boolean_query).in_boolean_mode()
+            relevance = match(Movie.title, Movie.original_title, against=q).in_natural_language_mode()
+            return full_text, relevance
+        # Too short for the FULLTEXT index
+        return substring_match, literal(0.0)
+
+    return substring_match, literal(0.0)
+
+
+def find_movies_by_title(
+    db: Session,
+    q: str,
+    limit: int,
+    after: Optional[Sequence[float]] = None
+) -> List[Tuple[Movie, float]]:
+    """
+    Movies matching `q` in title or original title, best matches first.
+
+    Args:
+        after: (relevance, id) of the last movie of the previous page
+
+    Returns:
+        (movie, relevance) pairs ordered by relevance desc, id asc
+    """
+    match_clause, relevance = title_search_terms(db, q)
+
+    query = db.query(Movie, relevance.label("relevance")).options(
+        selectinload(Movie.genres)
+    ).filter(
+        match_clause
+    )
+    if after is not None:
+        last_relevance, last_id = after
+        query = query.filter(or_(
+            relevance < last_relevance,
+            and_(relevance == last_relevance, Movie.id > last_id)
+        ))
+
+    return [
+        (movie, float(score))
+        for movie, score in query.order_by(relevance.desc(), Movie.id).limit(limit)
+    ]
+
+
+def find_movies_fuzzy(db: Session, q: str, limit: int, offset: int = 0) -> List[Movie]:
+    """
+    Movies whose title is within a few typos of `q`, ranked by the in-process trigram index.
+
+    The ranking is computed in memory, so paging through it by position is cheap.
+    """
+    movie_ids = run_blocking(fuzzy_title_index.search, q, limit, offset)
+    if not movie_ids:
+        return []
+
+    movies = db.query(Movie).options(
+        selectinload(Movie.genres)
+    ).filter(
+        Movie.id.in_(movie_ids)
+    ).all()
+
+    position = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+    return sorted(movies, key=lambda movie: position[movie.id])
@@ -0,0 +1,357 @@
+"""
+Trending opinions: a time-decayed vote score.
+
+Scanning opinion_votes on every request would grow with the vote history, so
+votes are also rolled up into per-opinion buckets (models.vote.OpinionVoteBucket)
+in the same transaction that stores the vote:
+
+- hourly buckets for the last HOURLY_BUCKET_RETENTION_HOURS,
+- daily buckets (compact_vote_buckets() folds older hourly buckets into them)
+  up to TRENDING_WINDOW_DAYS, after which they are dropped.
+
+Each opinion therefore has at most HOURLY_BUCKET_RETENTION_HOURS +
+TRENDING_WINDOW_DAYS buckets to sum, and trending_opinions() sums them in the
+database, returning only the top opinions. A vote's weight halves every
+TRENDING_HALF_LIFE_HOURS.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import DateTime, and_, case, delete, func, literal, literal_column, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import GeneratedOpinion, Movie, OpinionVoteBucket, UserOpinion
+from schemas.opinion import OpinionKind
+
+# Hours after which a vote counts half as much
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+
+# Votes older than this no longer count at all
+TRENDING_WINDOW_DAYS = int(os.getenv("TRENDING_WINDOW_DAYS", "7"))
+
+# Hourly buckets older than this are folded into daily buckets
+HOURLY_BUCKET_RETENTION_HOURS = int(os.getenv("HOURLY_BUCKET_RETENTION_HOURS", "48"))
+
+# How often each worker runs the compaction job
+TRENDING_COMPACT_SECONDS = float(os.getenv("TRENDING_COMPACT_SECONDS", "3600"))
+
+# Hourly buckets folded per compaction transaction
+COMPACT_BATCH_SIZE = 5000
+
+# Contribution of one vote of each type to the trending score
+TRENDING_WEIGHTS = {
+    "up_votes": 1.0,
+    "lol_votes": 1.0,
+    "wtf_votes": 1.0,
+    "down_votes": -1.0,
+}
+
+BUCKET_COUNTERS = ("up_votes", "down_votes", "lol_votes", "wtf_votes", "vote_count")
+
+# Bucket column pointing at each opinion model / kind
+BUCKET_FOREIGN_KEYS = {
+    GeneratedOpinion: "generated_opinion_id",
+    UserOpinion: "user_opinion_id",
+}
+KIND_FOREIGN_KEYS = {
+    OpinionKind.GENERATED: "generated_opinion_id",
+    OpinionKind.USER: "user_opinion_id",
+}
+
+
+class TrendingOpinion(NamedTuple):
+    id: int
+    kind: OpinionKind
+    movie_id: int
+    movie_title: str
+    content: str
+    trending_score: float
+    recent_votes: int
+    author_name: Optional[str] = None
+    absurdity_score: Optional[float] = None
+    generation_method: Optional[str] = None
+
+
+def hour_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_to_vote_bucket(db: Session, model, opinion_id: int, voted_at: datetime, counts: Dict[str, int]):
+    """
+    Add vote counts (e.g. services.votes.counter_deltas) to an opinion's hourly bucket.
+
+    Does not commit; counts other than BUCKET_COUNTERS are ignored.
+    """
+    counts = {name: delta for name, delta in counts.items() if name in BUCKET_COUNTERS and delta}
+    if counts:
+        _add_to_bucket(db, BUCKET_FOREIGN_KEYS[model], opinion_id, hour_start(voted_at), 1, counts)
+
+
+def add_to_vote_buckets(db: Session, model, counts: Dict[Tuple[int, datetime], Dict[str, int]]):
+    """
+    Batch form of add_to_vote_bucket(): (opinion_id, voted_at) -> vote counts.
+
+    All hourly buckets are upserted with one executemany where the database
+    supports upserts. Does not commit.
+    """
+    foreign_key = BUCKET_FOREIGN_KEYS[model]
+    hours: Dict[Tuple[int, datetime], Dict[str, int]] = {}
+    for (opinion_id, voted_at), bucket_counts in counts.items():
+        totals = hours.setdefault((opinion_id, hour_start(voted_at)), dict.fromkeys(BUCKET_COUNTERS, 0))
+        for name in BUCKET_COUNTERS:
+            totals[name] += bucket_counts.get(name, 0)
+    # Sorted, so concurrent batches lock buckets in the same order
+    rows = [
+        {foreign_key: opinion_id, "bucket_start": start, "bucket_hours": 1, **totals}
+        for (opinion_id, start), totals in sorted(hours.items())
+    ]
+    if not rows:
+        return
+
+    table = OpinionVoteBucket.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(table)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[foreign_key, "bucket_hours", "bucket_start"],
+            set_={name: table.c[name] + statement.excluded[name] for name in BUCKET_COUNTERS}
+        ), rows)
+    elif dialect == "mysql":
+        statement = mysql.insert(table)
+        db.execute(statement.on_duplicate_key_update(
+            {name: table.c[name] + statement.inserted[name] for name in BUCKET_COUNTERS}
+        ), rows)
+    else:
+        for row in rows:
+            _add_to_bucket(db, foreign_key, row[foreign_key], row["bucket_start"], 1,
+                           {name: row[name] for name in BUCKET_COUNTERS if row[name]})
+
+
+def remove_from_vote_bucket(db: Session, model, opinion_id: int, voted_at: datetime, counts: Dict[str, int]):
+    """
+    Take a changed vote back out of the bucket that counted it (does not commit).
+
+    That is its hourly bucket, or the daily bucket the hour was folded into;
+    buckets already dropped from the window are left alone.
+    """
+    counts = {name: delta for name, delta in counts.items() if name in BUCKET_COUNTERS and delta}
+    if not counts:
+        return
+    opinion_column = getattr(OpinionVoteBucket, BUCKET_FOREIGN_KEYS[model])
+    for bucket_start, bucket_hours in ((hour_start(voted_at), 1), (day_start(voted_at), 24)):
+        updated = db.execute(update(OpinionVoteBucket).where(
+            opinion_column == opinion_id,
+            OpinionVoteBucket.bucket_hours == bucket_hours,
+            OpinionVoteBucket.bucket_start == bucket_start
+        ).values({
+            name: getattr(OpinionVoteBucket, name) - delta for name, delta in counts.items()
+        })).rowcount
+        if updated:
+            return
+
+
+def compact_vote_buckets(db: Session, now: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Fold old hourly buckets into daily ones and drop buckets outside the window.
+
+    Safe to run from several workers at once: hourly buckets are claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED, so each one is folded exactly once.
+
+    Returns:
+        (hourly buckets folded, buckets dropped)
+    """
+    now = now or datetime.utcnow()
+    dropped = db.execute(delete(OpinionVoteBucket).where(
+        OpinionVoteBucket.bucket_start < day_start(now - timedelta(days=TRENDING_WINDOW_DAYS))
+    )).rowcount
+    db.commit()
+
+    hourly_cutoff = hour_start(now - timedelta(hours=HOURLY_BUCKET_RETENTION_HOURS))
+    folded = 0
+    while True:
+        buckets = db.query(
+            OpinionVoteBucket.id,
+            OpinionVoteBucket.generated_opinion_id,
+            OpinionVoteBucket.user_opinion_id,
+            OpinionVoteBucket.bucket_start,
+            *(getattr(OpinionVoteBucket, name) for name in BUCKET_COUNTERS)
+        ).filter(
+            OpinionVoteBucket.bucket_hours == 1,
+            OpinionVoteBucket.bucket_start < hourly_cutoff
+        ).order_by(
+            OpinionVoteBucket.id
+        ).limit(COMPACT_BATCH_SIZE).with_for_update(skip_locked=True).all()
+        if not buckets:
+            break
+
+        days: Dict[Tuple[str, int, datetime], Dict[str, int]] = {}
+        for bucket in buckets:
+            if bucket.generated_opinion_id is not None:
+                key = ("generated_opinion_id", bucket.generated_opinion_id, day_start(bucket.bucket_start))
+            else:
+                key = ("user_opinion_id", bucket.user_opinion_id, day_start(bucket.bucket_start))
+            totals = days.setdefault(key, dict.fromkeys(BUCKET_COUNTERS, 0))
+            for name in BUCKET_COUNTERS:
+                totals[name] += getattr(bucket, name)
+
+        for (foreign_key, opinion_id, start), totals in days.items():
+            _add_to_bucket(db, foreign_key, opinion_id, start, 24, totals)
+        db.execute(delete(OpinionVoteBucket).where(
+            OpinionVoteBucket.id.in_([bucket.id for bucket in buckets])
+        ))
+        db.commit()
+        folded += len(buckets)
+
+    return folded, dropped
+
+
+def trending_opinions(
+    db: Session,
+    limit: int,
+    kind: Optional[OpinionKind] = None,
+    now: Optional[datetime] = None
+) -> List[TrendingOpinion]:
+    """
+    The `limit` opinions with the highest decayed vote score, best first.
+
+    Scored, ranked and cut to `limit` in the database: one GROUP BY over the
+    buckets in the window returns only the top opinions. Every weight in it is
+    exp(-decay * (now - midpoint)) = exp(-decay * (now - window start)) *
+    exp(decay * (midpoint - window start)); the first factor is the same for
+    every opinion, so the query sums the second (bounded by the window length)
+    and the factor is applied to the `limit` rows it returns.
+    """
+    now = now or datetime.utcnow()
+    window_start = day_start(now - timedelta(days=TRENDING_WINDOW_DAYS))
+    decay_per_hour = math.log(2) / TRENDING_HALF_LIFE_HOURS
+
+    # Votes are spread over the bucket; weigh them at its midpoint (at most now)
+    now_hours = (now - window_start).total_seconds() / 3600
+    midpoint_hours = _hours_since(db, window_start) + OpinionVoteBucket.bucket_hours / 2.0
+    midpoint_hours = case((midpoint_hours > now_hours, now_hours), else_=midpoint_hours)
+    signal = sum(weight * getattr(OpinionVoteBucket, name) for name, weight in TRENDING_WEIGHTS.items())
+    score = func.sum(signal * func.exp(decay_per_hour * midpoint_hours)).label("score")
+    query = db.query(
+        OpinionVoteBucket.generated_opinion_id,
+        OpinionVoteBucket.user_opinion_id,
+        score,
+        func.sum(OpinionVoteBucket.vote_count).label("recent_votes")
+    ).filter(
+        OpinionVoteBucket.bucket_start >= window_start
+    )
+    if kind is not None:
+        query = query.filter(getattr(OpinionVoteBucket, KIND_FOREIGN_KEYS[kind]).isnot(None))
+    top = query.group_by(
+        OpinionVoteBucket.generated_opinion_id,
+        OpinionVoteBucket.user_opinion_id
+    ).having(score > 0).order_by(score.desc()).limit(limit).all()
+    if not top:
+        return []
+
+    elapsed_decay = math.exp(-decay_per_hour * now_hours)
+    ranked = [
+        (
+            (OpinionKind.GENERATED, row.generated_opinion_id) if row.generated_opinion_id is not None
+            else (OpinionKind.USER, row.user_opinion_id),
+            row.score * elapsed_decay,
+            row.recent_votes
+        )
+        for row in top
+    ]
+    opinions = _load_opinions(db, [key for key, _, _ in ranked])
+    return [
+        opinions[key]._replace(trending_score=round(score, 4), recent_votes=recent_votes)
+        for key, score, recent_votes in ranked
+        if key in opinions
+    ]
+
+
+def _hours_since(db: Session, start: datetime):
+    """SQL expression: hours from `start` to each bucket's bucket_start."""
+    start = literal(start, DateTime)
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return func.extract("epoch", OpinionVoteBucket.bucket_start - start) / 3600.0
+    if dialect == "mysql":
+        return func.timestampdiff(literal_column("SECOND"), start, OpinionVoteBucket.bucket_start) / 3600.0
+    return (func.julianday(OpinionVoteBucket.bucket_start) - func.julianday(start)) * 24.0
+
+
+def _load_opinions(db: Session, keys: List[Tuple[OpinionKind, int]]) -> Dict[Tuple[OpinionKind, int], TrendingOpinion]:
+    """Opinion rows for the ranked (kind, id) pairs, with trending fields left at zero."""
+    generated_ids = [opinion_id for kind, opinion_id in keys if kind == OpinionKind.GENERATED]
+    user_ids = [opinion_id for kind, opinion_id in keys if kind == OpinionKind.USER]
+    opinions = {}
+
+    if generated_ids:
+        rows = db.query(
+            GeneratedOpinion.id,
+            GeneratedOpinion.movie_id,
+            Movie.title,
+            GeneratedOpinion.content,
+            GeneratedOpinion.absurdity_score,
+            GeneratedOpinion.generation_method
+        ).join(
+            Movie, GeneratedOpinion.movie_id == Movie.id
+        ).filter(GeneratedOpinion.id.in_(generated_ids))
+        for opinion_id, movie_id, title, content, absurdity_score, generation_method in rows:
+            opinions[(OpinionKind.GENERATED, opinion_id)] = TrendingOpinion(
+                opinion_id, OpinionKind.GENERATED, movie_id, title, content, 0.0, 0,
+                absurdity_score=absurdity_score, generation_method=generation_method
+            )
+
+    if user_ids:
+        rows = db.query(
+            UserOpinion.id,
+            UserOpinion.movie_id,
+            Movie.title,
+            UserOpinion.content,
+            UserOpinion.author_name
+        ).join(
+            Movie, UserOpinion.movie_id == Movie.id
+        ).filter(UserOpinion.id.in_(user_ids))
+        for opinion_id, movie_id, title, content, author_name in rows:
+            opinions[(OpinionKind.USER, opinion_id)] = TrendingOpinion(
+                opinion_id, OpinionKind.USER, movie_id, title, content, 0.0, 0, author_name=author_name
+            )
+
+    return opinions
+
+
+def _add_to_bucket(db: Session, foreign_key: str, opinion_id: int, bucket_start: datetime,
+                   bucket_hours: int, counts: Dict[str, int]):
+    """Insert a bucket or add `counts` to the existing one, in a single statement where supported."""
+    table = OpinionVoteBucket.__table__
+    values = {foreign_key: opinion_id, "bucket_start": bucket_start, "bucket_hours": bucket_hours, **counts}
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(table).values(values)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[foreign_key, "bucket_hours", "bucket_start"],
+            set_={name: table.c[name] + statement.excluded[name] for name in counts}
+        ))
+        return
+
+    if dialect == "mysql":
+        statement = mysql.insert(table).values(values)
+        db.execute(statement.on_duplicate_key_update(
+            {name: table.c[name] + statement.inserted[name] for name in counts}
+        ))
+        return
+
+    updated = db.execute(update(table).where(and_(
+        table.c[foreign_key] == opinion_id,
+        table.c.bucket_hours == bucket_hours,
+        table.c.bucket_start == bucket_start
+    )).values({name: table.c[name] + delta for name, delta in counts.items()})).rowcount
+    if not updated:
+        db.execute(table.insert().values(values))
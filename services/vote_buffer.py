@@ -0,0 +1,355 @@
+"""
+Write-behind vote ingestion.
+
+Storing a vote synchronously costs the voter's earlier-vote lookup, the
+INSERT and counter updates, and a COMMIT (one fsync). With VOTE_BUFFER_ENABLED=true the vote
+endpoints instead check the opinion id against an in-memory set of known
+opinions, queue the vote and answer 202. A background thread stores queued
+votes with services.votes.record_votes() every VOTE_BUFFER_FLUSH_MS or every
+VOTE_BUFFER_BATCH_SIZE votes, whichever comes first: one multi-row INSERT and
+one commit per batch.
+
+The queue holds at most VOTE_BUFFER_MAX_PENDING votes. When it is full the
+endpoints answer 503 so clients back off instead of the worker running out of
+memory.
+
+stop() runs on application shutdown and stores whatever is still queued. Votes
+it cannot store (the database is still failing after SHUTDOWN_FLUSH_ATTEMPTS,
+or stop()'s timeout runs out) are written to a spill file in
+VOTE_BUFFER_SPILL_DIR and fsynced, never dropped. The next worker to start
+claims each spill file (an atomic rename, so only one worker replays it),
+stores its votes like any other batch and deletes it. Replay is at least
+once: a batch the database committed just as the timeout ran out is stored
+again, which the unique (opinion, voter) index turns into duplicates; only
+anonymous votes would count twice. A file left as *.replaying by a worker
+killed during its replay is reported at startup and can be replayed by
+renaming it back to *.jsonl.
+"""
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import null
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import GeneratedOpinion, UserOpinion, VoteType
+from services.leaderboard import leaderboard
+from services.offload import run_blocking
+from services.votes import PendingVote, record_votes
+
+logger = logging.getLogger(__name__)
+
+VOTE_BUFFER_ENABLED = os.getenv("VOTE_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Longest a queued vote waits before its batch is stored
+VOTE_BUFFER_FLUSH_MS = int(os.getenv("VOTE_BUFFER_FLUSH_MS", "200"))
+
+# Votes stored per INSERT / COMMIT
+VOTE_BUFFER_BATCH_SIZE = int(os.getenv("VOTE_BUFFER_BATCH_SIZE", "500"))
+
+# Queued votes per worker before the endpoints answer 503
+VOTE_BUFFER_MAX_PENDING = int(os.getenv("VOTE_BUFFER_MAX_PENDING", "10000"))
+
+# Longest pause between attempts while the database is unavailable
+MAX_RETRY_DELAY_SECONDS = 5.0
+
+# Attempts per batch once shutdown has started, before it is spilled to disk
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+# Directory of the files holding votes that could not be stored at shutdown
+# (shared by the workers of a host; must survive restarts)
+VOTE_BUFFER_SPILL_DIR = os.getenv("VOTE_BUFFER_SPILL_DIR", "vote_spill")
+
+# Opinion model of each spilled vote's "kind"
+SPILL_MODELS = {model.__tablename__: model for model in (GeneratedOpinion, UserOpinion)}
+
+
+class OpinionIdCache:
+    """
+    Ids of existing opinions, plus the absurdity score of generated ones.
+
+    Loaded at startup and refreshed with the catalog indexes (main.py) when
+    VOTE_BUFFER_ENABLED is set, so votes never wait for a reload.
+    """
+
+    def __init__(self):
+        self._known: Dict[type, Dict[int, Optional[float]]] = {GeneratedOpinion: {}, UserOpinion: {}}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def reload(self, db: Session):
+        """Replace the cache with the opinions currently in the database."""
+        rows = {model: db.query(*_cached_columns(model)).all() for model in self._known}
+        run_blocking(self._rebuild, rows)
+
+    def _rebuild(self, rows):
+        known = {model: dict(model_rows) for model, model_rows in rows.items()}
+        with self._lock:
+            self._known = known
+            self._loaded_at = time.monotonic()
+
+    def add(self, model, opinion_id: int, absurdity_score: Optional[float] = None):
+        """Record a freshly committed opinion (ignored until the cache is in use)."""
+        with self._lock:
+            if self._loaded_at is not None:
+                self._known[model][opinion_id] = absurdity_score
+
+    def contains(self, db: Session, model, opinion_id: int) -> bool:
+        """Whether the opinion exists; only ids missing from the cache cost a query."""
+        if opinion_id in self._known[model]:
+            return True
+
+        # Possibly created since the last reload, e.g. by another worker
+        row = db.query(*_cached_columns(model)).filter(model.id == opinion_id).first()
+        if row is None:
+            return False
+        with self._lock:
+            self._known[model][row[0]] = row[1]
+        return True
+
+    def absurdity_score(self, opinion_id: int) -> Optional[float]:
+        return self._known[GeneratedOpinion].get(opinion_id)
+
+
+class VoteBuffer:
+    """Bounded in-process queue of votes, stored in batches by a background thread."""
+
+    def __init__(
+        self,
+        flush_ms: int = VOTE_BUFFER_FLUSH_MS,
+        batch_size: int = VOTE_BUFFER_BATCH_SIZE,
+        max_pending: int = VOTE_BUFFER_MAX_PENDING,
+        spill_dir: str = VOTE_BUFFER_SPILL_DIR
+    ):
+        self.flush_seconds = flush_ms / 1000
+        self.batch_size = batch_size
+        self.spill_dir = spill_dir
+        self._queue: "queue.Queue[PendingVote]" = queue.Queue(maxsize=max_pending)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Batch being stored by the flush thread, spilled too if stop() times out
+        self._in_flight: List[PendingVote] = []
+        self._spill_lock = threading.Lock()
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the flush thread; it first replays the votes spilled by earlier shutdowns."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="vote-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Store every queued vote, then stop the flush thread.
+
+        Votes still unstored when `timeout` runs out are spilled to disk.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                self._spill(list(self._in_flight) + self._drain())
+            self._thread = None
+
+    def submit(self, vote: PendingVote):
+        """
+        Queue a vote.
+
+        Raises:
+            queue.Full: VOTE_BUFFER_MAX_PENDING votes are already waiting, or
+                the buffer is shutting down
+        """
+        if self._stopping.is_set():
+            raise queue.Full
+        self._queue.put_nowait(vote)
+
+    def _run(self):
+        self._replay_spilled()
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _next_batch(self) -> List[PendingVote]:
+        """Wait for a vote, then collect more until the batch is full or the flush interval is over."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_seconds)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and not self._stopping.is_set():
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[PendingVote]) -> bool:
+        """
+        Store a batch, retrying while the database is unavailable.
+
+        Once shutdown has started and SHUTDOWN_FLUSH_ATTEMPTS failed, the batch
+        and everything still queued are spilled to disk instead.
+
+        Returns:
+            Whether the batch was stored
+        """
+        self._in_flight = batch
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                counters = _store(batch)
+                break
+            except SQLAlchemyError:
+                if self._stopping.is_set() and attempt >= SHUTDOWN_FLUSH_ATTEMPTS:
+                    logger.exception("Could not store %d buffered votes in %d attempts", len(batch), attempt)
+                    self._spill(batch + self._drain())
+                    self._in_flight = []
+                    return False
+                delay = min(MAX_RETRY_DELAY_SECONDS, 0.1 * 2 ** attempt)
+                logger.exception("Could not store %d buffered votes, retrying in %.1fs", len(batch), delay)
+                time.sleep(delay)
+        self._in_flight = []
+
+        for (model, opinion_id), deltas in counters.items():
+            if model is GeneratedOpinion:
+                record_leaderboard_vote(opinion_id, deltas)
+        return True
+
+    def _drain(self) -> List[PendingVote]:
+        """Take every vote still queued."""
+        votes = []
+        while True:
+            try:
+                votes.append(self._queue.get_nowait())
+            except queue.Empty:
+                return votes
+
+    def _spill(self, votes: List[PendingVote]):
+        """Write votes to a new spill file (fsynced) for the next worker to replay."""
+        if not votes:
+            return
+        with self._spill_lock:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"votes-{os.getpid()}-{time.time_ns()}.jsonl")
+            with open(path + ".tmp", "w", encoding="utf-8") as spill:
+                for vote in votes:
+                    spill.write(json.dumps(_spilled_vote(vote)) + "\n")
+                spill.flush()
+                os.fsync(spill.fileno())
+            # Complete files only: a half-written one is never replayed
+            os.replace(path + ".tmp", path)
+        logger.warning("Spilled %d unstored votes to %s", len(votes), path)
+
+    def _replay_spilled(self):
+        """Store the votes of every spill file this worker can claim."""
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "*.replaying"))):
+            logger.warning("Spilled votes in %s were not fully replayed; rename it to *.jsonl to replay them", path)
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "*.jsonl"))):
+            claimed = f"{path}.{os.getpid()}.replaying"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue  # Claimed by another worker
+            with open(claimed, encoding="utf-8") as spill:
+                votes = [_pending_vote(json.loads(line)) for line in spill if line.strip()]
+            logger.info("Replaying %d spilled votes from %s", len(votes), path)
+            for start in range(0, len(votes), self.batch_size):
+                if not self._flush(votes[start:start + self.batch_size]):
+                    # Shutting down again: the rest went to a new spill file
+                    self._spill(votes[start + self.batch_size:])
+                    break
+            os.remove(claimed)
+
+
+def record_leaderboard_vote(opinion_id: int, deltas: Dict[str, int]):
+    """Apply a committed vote on a generated opinion to the leaderboard, scored from the id cache."""
+    absurdity_score = opinion_ids.absurdity_score(opinion_id)
+    if absurdity_score is None:
+        # Created by another worker since the cache was loaded
+        leaderboard.invalidate()
+    else:
+        leaderboard.record_vote(opinion_id, absurdity_score, deltas)
+
+
+def _store(batch: List[PendingVote]) -> Dict[Tuple[type, int], Dict[str, int]]:
+    """One attempt at storing a batch in a single transaction."""
+    db = SessionLocal()
+    try:
+        try:
+            _, counters = record_votes(db, batch)
+            db.commit()
+            return counters
+        except IntegrityError:
+            db.rollback()
+
+        # An opinion was deleted after its id was cached, or another worker stored
+        # a vote of the same voter first: store the votes one by one
+        counters: Dict[Tuple[type, int], Dict[str, int]] = {}
+        for vote in batch:
+            try:
+                with db.begin_nested():
+                    _, stored = record_votes(db, [vote])
+            except IntegrityError:
+                logger.warning("Dropping buffered vote on %s %d", vote.model.__tablename__, vote.opinion_id)
+                continue
+            for key, deltas in stored.items():
+                totals = counters.setdefault(key, {})
+                for name, delta in deltas.items():
+                    totals[name] = totals.get(name, 0) + delta
+        db.commit()
+        return counters
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _spilled_vote(vote: PendingVote) -> dict:
+    return {
+        "kind": vote.model.__tablename__,
+        "opinion_id": vote.opinion_id,
+        "vote_type": vote.vote_type.name,
+        "voter_identifier": vote.voter_identifier,
+        "created_at": vote.created_at.isoformat(),
+    }
+
+
+def _pending_vote(data: dict) -> PendingVote:
+    return PendingVote(
+        SPILL_MODELS[data["kind"]],
+        data["opinion_id"],
+        VoteType[data["vote_type"]],
+        data["voter_identifier"],
+        datetime.fromisoformat(data["created_at"]),
+    )
+
+
+def _cached_columns(model):
+    if model is GeneratedOpinion:
+        return GeneratedOpinion.id, GeneratedOpinion.absurdity_score
+    return model.id, null()
+
+
+# One buffer and id cache per worker process
+opinion_ids = OpinionIdCache()
+vote_buffer = VoteBuffer()
@@ -0,0 +1,463 @@
+"""
+Vote counters for opinions.
+
+Ranking opinions used to aggregate every row of opinion_votes on each request.
+Each opinion now carries its own counters (see models.opinion.VoteCountersMixin),
+bumped with an atomic `SET col = col + 1` in the same transaction that stores
+the vote. reconcile_vote_counters() rebuilds them from the raw votes.
+
+record_vote() / record_votes() are the only places votes are written: they
+store the vote rows and update the counters and trending buckets
+(services/trending.py) in the caller's transaction. Each voter has at most one
+vote per opinion (unique indexes on opinion_votes): voting again with another
+type changes that vote, repeating it is rejected.
+
+Rankings by votes (top user opinions, a movie's user opinions) read the
+counters through the (vote_balance, id) indexes instead of grouping votes.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, insert, literal, null, or_, select, tuple_, union_all, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import GeneratedOpinion, Movie, OpinionVote, UserOpinion, VoteType
+from schemas.opinion import TopUserOpinionResponse
+from services.trending import add_to_vote_bucket, add_to_vote_buckets, remove_from_vote_bucket
+
+# Counter column for each vote type
+COUNTER_COLUMNS = {
+    VoteType.UP: "up_votes",
+    VoteType.DOWN: "down_votes",
+    VoteType.LOL: "lol_votes",
+    VoteType.WTF: "wtf_votes",
+}
+
+# Outcome of each vote passed to record_votes()
+VOTE_CREATED = "created"
+VOTE_CHANGED = "changed"
+VOTE_DUPLICATE = "duplicate"
+VOTE_NOT_FOUND = "not_found"
+
+# (opinion, voter) pairs looked up per query when storing a batch
+LOOKUP_CHUNK_SIZE = 500
+
+# Which opinion_votes column points at each opinion model
+VOTE_FOREIGN_KEYS = {
+    GeneratedOpinion: OpinionVote.generated_opinion_id,
+    UserOpinion: OpinionVote.user_opinion_id,
+}
+
+
+def counter_deltas(vote_type: VoteType, sign: int = 1) -> Dict[str, int]:
+    """Counter changes caused by adding (sign=1) or removing (sign=-1) one vote."""
+    deltas = {COUNTER_COLUMNS[vote_type]: sign, "vote_count": sign}
+    if vote_type == VoteType.UP:
+        deltas["vote_balance"] = sign
+    elif vote_type == VoteType.DOWN:
+        deltas["vote_balance"] = -sign
+    return deltas
+
+
+def apply_vote_counters(db: Session, model, opinion_id: int, deltas: Dict[str, int]) -> Optional[float]:
+    """
+    Atomically add `deltas` to an opinion's counters.
+
+    Returns:
+        The absurdity score of a generated opinion, for the leaderboard: from
+        the UPDATE's RETURNING clause, or a lookup by id where UPDATE can't
+        return rows (MySQL). None for user opinions.
+    """
+    values = {name: getattr(model, name) + delta for name, delta in deltas.items() if delta}
+    statement = update(model).where(model.id == opinion_id).values(values)
+    if model is not GeneratedOpinion:
+        if values:
+            db.execute(statement)
+        return None
+    if values and db.get_bind().dialect.update_returning:
+        return db.execute(statement.returning(GeneratedOpinion.absurdity_score)).scalar()
+    if values:
+        db.execute(statement)
+    return db.query(GeneratedOpinion.absurdity_score).filter(GeneratedOpinion.id == opinion_id).scalar()
+
+
+def apply_vote_counters_many(db: Session, model, counters: Dict[int, Dict[str, int]]):
+    """Batch form of apply_vote_counters(): opinion_id -> deltas, sent as one executemany UPDATE."""
+    if not counters:
+        return
+    table = model.__table__
+    names = sorted({name for deltas in counters.values() for name in deltas})
+    statement = update(table).where(table.c.id == bindparam("opinion_id")).values({
+        name: table.c[name] + bindparam(f"delta_{name}") for name in names
+    })
+    # Sorted, so concurrent batches lock opinions in the same order
+    db.execute(statement, [
+        {"opinion_id": opinion_id, **{f"delta_{name}": deltas.get(name, 0) for name in names}}
+        for opinion_id, deltas in sorted(counters.items())
+    ])
+
+
+class PendingVote(NamedTuple):
+    """A vote accepted by the API but not stored yet (see services/vote_buffer.py)."""
+    model: type  # GeneratedOpinion or UserOpinion
+    opinion_id: int
+    vote_type: VoteType
+    voter_identifier: Optional[str]
+    created_at: datetime
+
+
+class _UpsertedVote(NamedTuple):
+    id: int
+    previous_vote_type: Optional[VoteType]
+    previous_created_at: Optional[datetime]
+
+
+class DuplicateVoteError(Exception):
+    """The voter already cast exactly this vote on the opinion."""
+
+
+def record_vote(
+    db: Session,
+    model,
+    opinion_id: int,
+    vote_type: VoteType,
+    voter_identifier: Optional[str]
+) -> Tuple[OpinionVote, Dict[str, int], Optional[float]]:
+    """
+    Store a vote, or change the voter's earlier vote on the opinion (does not commit).
+
+    One upsert on the unique (opinion, voter) index: INSERT ... ON CONFLICT DO
+    UPDATE (ON DUPLICATE KEY UPDATE on MySQL). A changed vote copies its old
+    type and time into previous_vote_type / previous_created_at in the same
+    statement, so the counters move from the old type to the new one without
+    reading the row first, and concurrent votes of the same voter queue on the
+    row instead of failing. Also updates the opinion's counters and trending buckets.
+
+    Returns:
+        (vote, counter deltas applied to the opinion,
+         absurdity score of a generated opinion, None for user opinions)
+
+    Raises:
+        DuplicateVoteError: the voter already cast this vote
+    """
+    now = datetime.utcnow()
+    row = _upsert_vote(db, model, opinion_id, vote_type, voter_identifier, now)
+    vote = OpinionVote(id=row.id, vote_type=vote_type, voter_identifier=voter_identifier, created_at=now)
+    setattr(vote, VOTE_FOREIGN_KEYS[model].key, opinion_id)
+
+    if row.previous_vote_type is None:
+        deltas = counter_deltas(vote_type)
+    else:
+        deltas = {}
+        _add_deltas(deltas, counter_deltas(row.previous_vote_type, -1))
+        _add_deltas(deltas, counter_deltas(vote_type))
+        remove_from_vote_bucket(db, model, opinion_id, row.previous_created_at, counter_deltas(row.previous_vote_type))
+
+    absurdity_score = apply_vote_counters(db, model, opinion_id, deltas)
+    add_to_vote_bucket(db, model, opinion_id, now, counter_deltas(vote_type))
+    return vote, deltas, absurdity_score
+
+
+def _upsert_vote(db: Session, model, opinion_id: int, vote_type: VoteType,
+                 voter_identifier: Optional[str], now: datetime):
+    """
+    Insert the vote or change the voter's earlier one.
+
+    Returns:
+        Row with the vote's id, previous_vote_type and previous_created_at
+        (previous_vote_type is None for a new vote)
+
+    Raises:
+        DuplicateVoteError: the earlier vote has the same type (left untouched)
+    """
+    table = OpinionVote.__table__
+    foreign_key = VOTE_FOREIGN_KEYS[model].key
+    values = {
+        foreign_key: opinion_id,
+        "vote_type": vote_type,
+        "voter_identifier": voter_identifier,
+        "created_at": now,
+        "previous_vote_type": None,
+        "previous_created_at": None,
+    }
+    if voter_identifier is None:
+        # Anonymous votes never conflict (NULLs are distinct in the unique indexes)
+        result = db.execute(insert(table).values(values))
+        return _UpsertedVote(result.inserted_primary_key[0], None, None)
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        # The assignments run left to right, so the previous_* ones see the old
+        # row; a repeat leaves previous_vote_type equal to vote_type
+        statement = mysql.insert(table).values(values)
+        new = statement.inserted
+        db.execute(statement.on_duplicate_key_update([
+            ("previous_vote_type", table.c.vote_type),
+            ("previous_created_at", table.c.created_at),
+            ("created_at", case((table.c.vote_type == new.vote_type, table.c.created_at), else_=new.created_at)),
+            ("vote_type", new.vote_type),
+        ]))
+        # No RETURNING: read it back, the row is locked by the upsert until commit
+        row = db.execute(select(table.c.id, table.c.previous_vote_type, table.c.previous_created_at).where(
+            table.c[foreign_key] == opinion_id,
+            table.c.voter_identifier == voter_identifier
+        )).one()
+        if row.previous_vote_type == vote_type:
+            raise DuplicateVoteError(f"{vote_type.value.upper()} vote already registered")
+        return row
+
+    insert_factory = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    statement = insert_factory(table).values(values)
+    # SET expressions see the row as it was: previous_* get the replaced vote
+    row = db.execute(statement.on_conflict_do_update(
+        index_elements=[foreign_key, "voter_identifier"],
+        set_={
+            "previous_vote_type": table.c.vote_type,
+            "previous_created_at": table.c.created_at,
+            "vote_type": statement.excluded.vote_type,
+            "created_at": statement.excluded.created_at,
+        },
+        # A repeat updates nothing and returns no row
+        where=table.c.vote_type != statement.excluded.vote_type
+    ).returning(table.c.id, table.c.previous_vote_type, table.c.previous_created_at)).first()
+    if row is None:
+        raise DuplicateVoteError(f"{vote_type.value.upper()} vote already registered")
+    return row
+
+
+def record_votes(
+    db: Session,
+    votes: Iterable[PendingVote]
+) -> Tuple[List[str], Dict[Tuple[type, int], Dict[str, int]]]:
+    """
+    Store many votes at once (does not commit).
+
+    Earlier votes of the same voters are looked up (and locked) with one query
+    per LOOKUP_CHUNK_SIZE pairs. New votes go in with one multi-row INSERT and
+    changed votes with one executemany UPDATE. Counters and trending buckets are
+    updated with one executemany per opinion model, however many votes each
+    opinion received.
+
+    Returns:
+        (VOTE_CREATED / VOTE_CHANGED / VOTE_DUPLICATE for each vote,
+         combined counter deltas per (model, opinion_id))
+
+    Raises:
+        StaleDataError: a looked-up vote was changed by a concurrent transaction
+    """
+    votes = list(votes)
+    existing = _existing_votes(db, votes)
+
+    statuses = []
+    current = {key: vote_type for key, (_, vote_type, _) in existing.items()}
+    latest: Dict[Tuple[type, int, str], PendingVote] = {}
+    inserts = []
+    for vote in votes:
+        if vote.voter_identifier is None:
+            # Anonymous votes cannot be matched to earlier ones
+            inserts.append(vote)
+            statuses.append(VOTE_CREATED)
+            continue
+        key = (vote.model, vote.opinion_id, vote.voter_identifier)
+        previous = current.get(key)
+        if previous == vote.vote_type:
+            statuses.append(VOTE_DUPLICATE)
+            continue
+        statuses.append(VOTE_CREATED if previous is None else VOTE_CHANGED)
+        current[key] = vote.vote_type
+        latest[key] = vote
+
+    changes = []
+    for key, vote in latest.items():
+        if key not in existing:
+            inserts.append(vote)
+        elif existing[key][1] != vote.vote_type:
+            changes.append((existing[key], vote))
+
+    counters: Dict[Tuple[type, int], Dict[str, int]] = {}
+    buckets: Dict[type, Dict[Tuple[int, datetime], Dict[str, int]]] = {model: {} for model in VOTE_FOREIGN_KEYS}
+    for vote in inserts + [vote for _, vote in changes]:
+        deltas = counter_deltas(vote.vote_type)
+        _add_deltas(counters.setdefault((vote.model, vote.opinion_id), {}), deltas)
+        hour = vote.created_at.replace(minute=0, second=0, microsecond=0)
+        _add_deltas(buckets[vote.model].setdefault((vote.opinion_id, hour), {}), deltas)
+    for (_, previous_type, _), vote in changes:
+        _add_deltas(counters[(vote.model, vote.opinion_id)], counter_deltas(previous_type, -1))
+
+    if inserts:
+        rows = []
+        for vote in inserts:
+            row = {"generated_opinion_id": None, "user_opinion_id": None}
+            row[VOTE_FOREIGN_KEYS[vote.model].key] = vote.opinion_id
+            row.update(vote_type=vote.vote_type, voter_identifier=vote.voter_identifier, created_at=vote.created_at)
+            rows.append(row)
+        db.execute(insert(OpinionVote.__table__), rows)
+    if changes:
+        table = OpinionVote.__table__
+        changed = db.execute(update(table).where(
+            table.c.id == bindparam("vote_id"),
+            table.c.vote_type == bindparam("previous_type")
+        ).values(vote_type=bindparam("new_type"), created_at=bindparam("changed_at")), [
+            {"vote_id": vote_id, "previous_type": previous_type, "new_type": vote.vote_type,
+             "changed_at": vote.created_at}
+            for (vote_id, previous_type, _), vote in changes
+        ]).rowcount
+        if db.get_bind().dialect.supports_sane_multi_rowcount and changed != len(changes):
+            raise StaleDataError("Votes were changed concurrently")
+
+    # Same lock order in every transaction (model, then opinion id), so
+    # concurrent batches cannot deadlock
+    for model in VOTE_FOREIGN_KEYS:
+        apply_vote_counters_many(db, model, {
+            opinion_id: deltas for (counted_model, opinion_id), deltas in counters.items() if counted_model is model
+        })
+    for model, counts in buckets.items():
+        add_to_vote_buckets(db, model, counts)
+    for (_, previous_type, previous_at), vote in sorted(
+        changes, key=lambda change: (change[1].model.__tablename__, change[1].opinion_id)
+    ):
+        remove_from_vote_bucket(db, vote.model, vote.opinion_id, previous_at, counter_deltas(previous_type))
+    return statuses, counters
+
+
+def find_opinions(db: Session, keys: Iterable[Tuple[type, int]]) -> Dict[Tuple[type, int], Optional[float]]:
+    """
+    Which of the (model, opinion_id) pairs exist, in a single query.
+
+    Returns:
+        (model, opinion_id) -> absurdity score (None for user opinions)
+    """
+    ids = {model: sorted({opinion_id for key_model, opinion_id in keys if key_model is model}) for model in VOTE_FOREIGN_KEYS}
+    selects = [
+        select(
+            literal(model.__tablename__).label("kind"),
+            model.id,
+            (model.absurdity_score if model is GeneratedOpinion else null()).label("absurdity_score")
+        ).where(model.id.in_(ids[model]))
+        for model in VOTE_FOREIGN_KEYS
+        if ids[model]
+    ]
+    if not selects:
+        return {}
+
+    models = {model.__tablename__: model for model in VOTE_FOREIGN_KEYS}
+    rows = db.execute(union_all(*selects) if len(selects) > 1 else selects[0])
+    return {(models[kind], opinion_id): absurdity_score for kind, opinion_id, absurdity_score in rows}
+
+
+def _existing_votes(db: Session, votes: List[PendingVote]) -> Dict[Tuple[type, int, str], Tuple[int, VoteType, datetime]]:
+    """Earlier votes of the same (opinion, voter) pairs: key -> (id, vote_type, created_at)."""
+    existing = {}
+    for model, foreign_key in VOTE_FOREIGN_KEYS.items():
+        pairs = sorted({
+            (vote.opinion_id, vote.voter_identifier)
+            for vote in votes
+            if vote.model is model and vote.voter_identifier is not None
+        })
+        for start in range(0, len(pairs), LOOKUP_CHUNK_SIZE):
+            rows = db.query(
+                foreign_key,
+                OpinionVote.voter_identifier,
+                OpinionVote.id,
+                OpinionVote.vote_type,
+                OpinionVote.created_at
+            ).filter(
+                tuple_(foreign_key, OpinionVote.voter_identifier).in_(pairs[start:start + LOOKUP_CHUNK_SIZE])
+            ).with_for_update()
+            for opinion_id, voter_identifier, vote_id, vote_type, created_at in rows:
+                existing[(model, opinion_id, voter_identifier)] = (vote_id, vote_type, created_at)
+    return existing
+
+
+def _add_deltas(totals: Dict[str, int], deltas: Dict[str, int]):
+    for name, delta in deltas.items():
+        totals[name] = totals.get(name, 0) + delta
+
+
+def reconcile_vote_counters(db: Session, model=GeneratedOpinion):
+    """Recompute every opinion's counters from opinion_votes (does not commit)."""
+    foreign_key = VOTE_FOREIGN_KEYS[model]
+
+    def count(*conditions):
+        return select(func.count(OpinionVote.id)).where(
+            foreign_key == model.id, *conditions
+        ).scalar_subquery()
+
+    db.execute(update(model).values(
+        up_votes=count(OpinionVote.vote_type == VoteType.UP),
+        down_votes=count(OpinionVote.vote_type == VoteType.DOWN),
+        lol_votes=count(OpinionVote.vote_type == VoteType.LOL),
+        wtf_votes=count(OpinionVote.vote_type == VoteType.WTF),
+        vote_count=count(),
+    ))
+    db.execute(update(model).values(vote_balance=model.up_votes - model.down_votes))
+
+
+def ranked_user_opinions(
+    db: Session,
+    limit: int,
+    after: Optional[Sequence[int]] = None,
+    movie_id: Optional[int] = None
+):
+    """
+    User opinions ordered by vote balance desc, id desc.
+
+    Args:
+        after: (vote_balance, id) of the last opinion of the previous page
+        movie_id: only opinions about this movie
+    """
+    query = db.query(
+        UserOpinion.id,
+        UserOpinion.movie_id,
+        Movie.title.label("movie_title"),
+        UserOpinion.author_name,
+        UserOpinion.content,
+        UserOpinion.created_at,
+        UserOpinion.vote_count,
+        UserOpinion.up_votes,
+        UserOpinion.down_votes,
+        UserOpinion.lol_votes,
+        UserOpinion.wtf_votes,
+        UserOpinion.vote_balance,
+    ).join(
+        Movie, UserOpinion.movie_id == Movie.id
+    )
+    if movie_id is not None:
+        query = query.filter(UserOpinion.movie_id == movie_id)
+    if after is not None:
+        last_balance, last_id = after
+        query = query.filter(
+            UserOpinion.vote_balance <= last_balance,
+            or_(
+                UserOpinion.vote_balance < last_balance,
+                and_(UserOpinion.vote_balance == last_balance, UserOpinion.id < last_id)
+            )
+        )
+
+    return query.order_by(
+        UserOpinion.vote_balance.desc(),
+        UserOpinion.id.desc()
+    ).limit(limit).all()
+
+
+def user_opinion_responses(rows) -> List[TopUserOpinionResponse]:
+    """Format ranked_user_opinions() rows for the API."""
+    return [
+        TopUserOpinionResponse(
+            id=row.id,
+            movie_id=row.movie_id,
+            movie_title=row.movie_title,
+            author_name=row.author_name,
+            content=row.content,
+            created_at=row.created_at.isoformat(),
+            vote_count=row.vote_count,
+            up_votes=row.up_votes,
+            down_votes=row.down_votes,
+            lol_votes=row.lol_votes,
+            wtf_votes=row.wtf_votes
+        )
+        for row in rows
+    ]
+
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# database.py and auth.py read their settings at import time
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ["API_KEY"] = "test-key"
+os.environ["DB_ASYNC"] = "false"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+API_HEADERS = {"X-API-Key": "test-key"}
+
+
+@pytest.fixture
+def db():
+    from database import SessionLocal, engine
+    from models import Base
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from main import app
+    from services.genre_registry import genre_registry
+
+    genre_registry.reload(db)
+    with TestClient(app) as test_client:
+        yield test_client
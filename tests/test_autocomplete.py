@@ -0,0 +1,16 @@
+from services.autocomplete import AutocompleteIndex
+
+
+def test_insert_is_merged_into_cached_prefixes():
+    index = AutocompleteIndex()
+    index.add(1, "The Dark Knight", popularity=10.0)
+    index.add(2, "Dark City", popularity=5.0)
+    assert [s.id for s in index.suggest("dar")] == [1, 2]
+    assert [s.id for s in index.suggest("d")] == [1, 2]
+
+    index.add(3, "Darkman", popularity=7.0)
+    index.add(4, "Heat", popularity=50.0)
+
+    assert [s.id for s in index.suggest("dar")] == [1, 3, 2]
+    assert [s.id for s in index.suggest("d")] == [1, 3, 2]
+    assert [s.id for s in index.suggest("dark")] == [1, 3, 2]
@@ -0,0 +1,34 @@
+from models import Genre
+from services.genre_registry import GenreRegistry
+from tests.conftest import API_HEADERS
+
+
+def test_create_movie_reuses_genre_with_other_case(client, db):
+    drama = Genre(name="Drama")
+    db.add(drama)
+    db.commit()
+
+    response = client.post(
+        "/pelicula/",
+        json={"title": "Case Study", "genre_names": ["drama", " DRAMA "]},
+        headers=API_HEADERS,
+    )
+
+    assert response.status_code == 201, response.text
+    assert response.json()["genres"] == [{"id": drama.id, "name": "Drama"}]
+    assert db.query(Genre).count() == 1
+    # Indexed under the stored name too
+    random_pick = client.get("/pelicula/random", params={"genre": "Drama"}, headers=API_HEADERS)
+    assert random_pick.status_code == 200, random_pick.text
+
+
+def test_unknown_name_finds_genre_created_elsewhere(db):
+    registry = GenreRegistry()
+    registry.reload(db)
+    # Created after the registry was loaded, e.g. by another worker
+    comedy = Genre(name="Comedy")
+    db.add(comedy)
+    db.commit()
+
+    assert registry.ids_for_names(db, ["comedy"]) == {"comedy": (comedy.id, "Comedy")}
+    assert db.query(Genre).count() == 1
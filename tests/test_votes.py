@@ -0,0 +1,38 @@
+from models import GeneratedOpinion, Movie, OpinionVote
+from tests.conftest import API_HEADERS
+
+
+def _opinion(db):
+    movie = Movie(title="Vote Target")
+    db.add(movie)
+    db.flush()
+    opinion = GeneratedOpinion(movie_id=movie.id, content="Absurd", absurdity_score=9.0, generation_method="template")
+    db.add(opinion)
+    db.commit()
+    return opinion.id
+
+
+def _counters(db, opinion_id):
+    db.expire_all()
+    opinion = db.get(GeneratedOpinion, opinion_id)
+    return opinion.up_votes, opinion.down_votes, opinion.vote_count, opinion.vote_balance
+
+
+def test_vote_is_created_changed_and_repeats_rejected(client, db):
+    opinion_id = _opinion(db)
+    url = f"/vote/opinion/{opinion_id}"
+
+    assert client.post(url, json={"vote_type": "up", "voter_identifier": "v1"}, headers=API_HEADERS).status_code == 201
+    assert client.post(url, json={"vote_type": "up", "voter_identifier": "v1"}, headers=API_HEADERS).status_code == 409
+    assert client.post(url, json={"vote_type": "down", "voter_identifier": "v1"}, headers=API_HEADERS).status_code == 200
+    assert _counters(db, opinion_id) == (0, 1, 1, -1)
+
+    # Changing back is a change, not a repeat of the first vote
+    assert client.post(url, json={"vote_type": "up", "voter_identifier": "v1"}, headers=API_HEADERS).status_code == 200
+    assert _counters(db, opinion_id) == (1, 0, 1, 1)
+    assert db.query(OpinionVote).count() == 1
+
+
+def test_vote_on_missing_opinion_is_404(client, db):
+    response = client.post("/vote/opinion/12345", json={"vote_type": "lol", "voter_identifier": "v1"}, headers=API_HEADERS)
+    assert response.status_code == 404